@@ -1,14 +1,21 @@
 import streamlit as st
-import requests
 import pandas as pd
-import json
-import os
 from typing import Dict, Any
-from bs4 import BeautifulSoup
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime
 import time
+import cache
+import engine
+import storage
+import kosten
+import metrics
+import http_client
+import vloot_import
+import pipeline
+import warmup
+from lookups import normalize_kenteken
+from pipeline import get_all_rdw_data, get_overijssel_price
 
 #########################################
 # Custom CSS voor moderne UI
@@ -202,36 +209,96 @@ def load_css():
 # Functies voor persistente opslag
 #########################################
 
-DATA_FILE = "data.json"
+DATA_FILE = "data.json"  # oud formaat, wordt eenmalig gemigreerd
+DB_FILE = "data.db"
+PERSISTENT_KEYS = ("overrides", "cars_info", "stamdata")
+
+def get_store():
+    """Open de gedeelde store, koppel de caches eraan en start het opwarmen (één keer per proces)."""
+    store = storage.get_store(DB_FILE, legacy_json_path=DATA_FILE)
+    cache.attach_store(store)
+    warmup.start(store)
+    return store
 
 def load_persistent_data():
-    """Laad data uit een lokaal JSON-bestand en zet deze in de session_state."""
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r") as f:
-            data = json.load(f)
-        st.session_state.overrides = data.get("overrides", {})
-        st.session_state.cars_info = data.get("cars_info", {})
-        st.session_state.rdw_cache = data.get("rdw_cache", {})
-        st.session_state.wegenbelasting_cache = data.get("wegenbelasting_cache", {})
-        st.session_state.stamdata = data.get("stamdata", {})
+    """Laad overrides, auto-info en stamdata uit de store en zet deze in de session_state.
+
+    De RDW- en wegenbelastingcaches worden niet per sessie gekopieerd; die
+    laden hun items pas bij het opzoeken uit de store.
+    """
+    store = get_store()
+    tracked = {}
+    for key in PERSISTENT_KEYS:
+        tracked[key] = storage.TrackedDict(store.get_all(key))
+        st.session_state[key] = tracked[key]
+    st.session_state.saver = storage.DebouncedSaver(store, tracked)
+
+def save_persistent_data(immediate: bool = False):
+    """Sla gewijzigde overrides, auto-info en stamdata op in de store.
+
+    Zonder wijzigingen gebeurt er niets. Standaard worden snelle opeenvolgende
+    wijzigingen gebundeld (debounce); met ``immediate`` wordt direct geschreven.
+    De caches schrijven hun wijzigingen zelf direct weg.
+    """
+    saver = st.session_state.saver
+    if immediate:
+        saver.flush()
     else:
-        st.session_state.overrides = {}
-        st.session_state.cars_info = {}
-        st.session_state.rdw_cache = {}
-        st.session_state.wegenbelasting_cache = {}
-        st.session_state.stamdata = {}
-
-def save_persistent_data():
-    """Sla de data uit de session_state veilig op in een JSON-bestand."""
-    data = {
-        "overrides": st.session_state.overrides,
-        "cars_info": st.session_state.cars_info,
-        "rdw_cache": st.session_state.rdw_cache,
-        "wegenbelasting_cache": st.session_state.wegenbelasting_cache,
-        "stamdata": st.session_state.stamdata,
-    }
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f)
+        saver.schedule()
+
+#########################################
+# Debugpaneel
+#########################################
+
+def show_debug_panel():
+    """Ingeklapt sidebarpaneel met tijd per stap, cache-hits en throttling (proces-breed)."""
+    with st.sidebar.expander("🛠️ Debug: prestaties", expanded=False):
+        stappen = metrics.stap_metingen()
+        if stappen:
+            st.dataframe(
+                pd.DataFrame([
+                    {
+                        'Stap': stap,
+                        'Aantal': m.aantal,
+                        'Totaal (s)': round(m.totaal, 3),
+                        'Gem. (ms)': round(m.totaal / m.aantal * 1000, 1),
+                        'Max (ms)': round(m.maximum * 1000, 1),
+                    }
+                    for stap, m in stappen.items()
+                ]),
+                use_container_width=True,
+                hide_index=True,
+            )
+        caches = []
+        for naam, lookup_cache in metrics.CACHES.items():
+            opzoekingen = lookup_cache.hits + lookup_cache.misses
+            caches.append({
+                'Cache': naam,
+                'Hits': lookup_cache.hits,
+                'Misses': lookup_cache.misses,
+                'Hitratio': f"{lookup_cache.hits / opzoekingen:.0%}" if opzoekingen else "-",
+                'Items': len(lookup_cache),
+            })
+        st.dataframe(pd.DataFrame(caches), use_container_width=True, hide_index=True)
+        for host, stats in http_client.throttle_stats().items():
+            st.caption(f"{host}: {stats['vertraagd']:g} vertraagd ({stats['wachttijd']:.1f} s), {stats['429']:g}× 429")
+        motor = engine.get_engine().status()
+        st.caption(
+            f"Ophaalmotor: {motor['opvragingen']} opvragingen, {motor['ontdubbeld']} ontdubbeld, "
+            f"{motor['rdw_queries']} RDW-queries, {motor['scrapes']} scrapes"
+        )
+        opwarm = warmup.status()
+        laatste = opwarm['laatste_verversing']
+        st.caption(
+            f"Opgewarmd: {opwarm['opgewarmd']} kentekens, ververst: {opwarm['ververst']}"
+            + (f" (laatst {datetime.fromtimestamp(laatste):%d-%m %H:%M})" if laatste else "")
+        )
+        st.download_button(
+            "⬇️ Prometheus-metrics",
+            metrics.prometheus_tekst(),
+            file_name="autoponti.prom",
+            mime="text/plain",
+        )
 
 #########################################
 # Moderne Login Screen
@@ -263,118 +330,318 @@ def show_login():
                     st.error("❌ Onjuist wachtwoord")
 
 #########################################
-# Python-functies (geoptimaliseerd)
+# Data-pipeline
 #########################################
 
-def get_all_rdw_data(kenteken: str) -> Dict[str, Any]:
-    """Haal ALLE RDW-gegevens voor een kenteken op in één keer (gecached)."""
-    kenteken = kenteken.upper().replace("-", "").strip()
-    if kenteken in st.session_state.rdw_cache:
-        return st.session_state.rdw_cache[kenteken]
-    try:
-        url_basis = f"https://opendata.rdw.nl/resource/m9d7-ebf2.json?kenteken={kenteken}"
-        response_basis = requests.get(url_basis)
-        response_basis.raise_for_status()
-        data_basis = response_basis.json()
-        if not data_basis:
-            st.session_state.rdw_cache[kenteken] = {"error": "Geen data gevonden"}
-            return {"error": "Geen data gevonden"}
-        data_basis = data_basis[0]
-        url_brandstof = f"https://opendata.rdw.nl/resource/8ys7-d773.json?kenteken={kenteken}"
-        response_brandstof = requests.get(url_brandstof)
-        response_brandstof.raise_for_status()
-        data_brandstof = response_brandstof.json()
-        if data_brandstof:
-            data_basis.update(data_brandstof[0])
-        for date_field in ["datum_eerste_toelating", "vervaldatum_apk"]:
-            if data_basis.get(date_field):
-                try:
-                    data_basis[date_field] = pd.to_datetime(data_basis[date_field], dayfirst=True).strftime('%d-%m-%Y')
-                except ValueError:
-                    pass
-        if data_basis.get("datum_eerste_toelating"):
-            try:
-                data_basis["datum_eerste_toelating"] = str(pd.to_datetime(data_basis["datum_eerste_toelating"], dayfirst=True).year)
-            except ValueError:
-                pass
-        st.session_state.rdw_cache[kenteken] = data_basis
-        return data_basis
-    except requests.RequestException as e:
-        st.session_state.rdw_cache[kenteken] = {"error": f"Error: {e}"}
-        return {"error": f"Error: {e}"}
-
-def get_rdw_data(kenteken: str, veld: str) -> Any:
-    """Haal een specifiek RDW-veld op, gebruikmakend van de gecachede data."""
-    all_data = get_all_rdw_data(kenteken)
-    if "error" in all_data:
-        return all_data["error"]
-    return all_data.get(veld)
-
-def get_rdw_brandstof(kenteken: str) -> str:
-    """Haal brandstoftype op."""
-    return get_rdw_data(kenteken, "brandstof_omschrijving")
-
-def get_rdw_brandstof_verbruik(kenteken: str, brandstof_type_keuze: str = None) -> float:
+def resultaat_sleutel(kenteken_list, stamdata_key) -> tuple:
     """
-    Haal brandstofverbruik op, met WLTP-voorkeur en correctie/fallback voor elektrische auto's.
+    Sleutel van de resultaatset: verandert alleen als de invoer van de berekening verandert.
+
+    Per kenteken de versie van het RDW-record en de wegenbelasting, zodat
+    schrijfacties van andere sessies of de achtergrond voor andere kentekens
+    de resultaten van deze sessie niet ongeldig maken.
     """
-    brandstof = get_rdw_brandstof(kenteken)
-    if brandstof_type_keuze == "ELEKTRICITEIT" or (brandstof and "ELEKTR" in brandstof.upper()):
-        verbruik = get_rdw_data(kenteken, "elektrisch_verbruik_enkel_elektrisch_wltp")
-        if verbruik is None or verbruik == "Veld niet gevonden":
-            verbruik = 170
-        try:
-            numeric_verbruik = float(verbruik)
-        except (ValueError, TypeError):
-            numeric_verbruik = 0.0
-        return numeric_verbruik / 10
-    else:
-        verbruik = get_rdw_data(kenteken, "brandstof_verbruik_gecombineerd_wltp")
-        if verbruik is None or verbruik == "Veld niet gevonden":
-            verbruik = get_rdw_data(kenteken, "brandstofverbruik_gecombineerd")
-        try:
-            numeric_verbruik = float(verbruik)
-        except (ValueError, TypeError):
-            numeric_verbruik = 0.0
-        return numeric_verbruik
-
-def get_overijssel_price(kenteken: str) -> str:
-    """Haal wegenbelasting op van wegenbelasting.net (webscraping, gecached)."""
-    if kenteken in st.session_state.wegenbelasting_cache:
-        return st.session_state.wegenbelasting_cache[kenteken]
-    url = "https://www.wegenbelasting.net/kenteken-check/"
-    post_data = {"submit_berekenen_kenteken": "1", "k": kenteken}
-    try:
-        response = requests.post(url, data=post_data)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        table = soup.find("table", class_="wb-resultaat")
-        if table:
-            for row in table.find_all("tr"):
-                if "Overijssel" in row.text:
-                    cells = row.find_all("td")
-                    if len(cells) >= 2:
-                        price_overijssel = cells[1].text.strip()
-                        st.session_state.wegenbelasting_cache[kenteken] = price_overijssel
-                        return price_overijssel
-        st.session_state.wegenbelasting_cache[kenteken] = "Niet gevonden"
-        return "Niet gevonden"
-    except requests.RequestException as e:
-        st.session_state.wegenbelasting_cache[kenteken] = f"Error: {e}"
-        return f"Error: {e}"
+    unieke_kentekens = list(dict.fromkeys(kenteken_list))
+    return (
+        tuple(kenteken_list),
+        stamdata_key,
+        st.session_state.overrides.revision,
+        tuple(cache.rdw_cache.version(normalize_kenteken(k)) for k in unieke_kentekens),
+        # `peek`, zodat elke rerun de hit/miss-tellers en de store ongemoeid laat
+        tuple(cache.wegenbelasting_cache.peek(k) for k in unieke_kentekens),
+    )
+
+def bereken_resultaten(kenteken_list, stamdata_key, memo_opschonen: bool = True):
+    """
+    Haal de data op en bereken de resultaten; geeft (results, waarschuwingen,
+    tijdelijke_fouten) terug, met ``tijdelijke_fouten`` True als een kenteken
+    door een tijdelijke fout (zie `cache.is_fout`) ontbreekt.
+
+    Met ``memo_opschonen=False`` blijven memo-items van auto's buiten
+    ``kenteken_list`` staan, voor het verwerken van een bestand in delen.
+    """
+    results = []
+    waarschuwingen = []
+    tijdelijke_fouten = False
+    
+    # Progress bar
+    progress_bar = st.progress(0)
+    
+    # Data gelijktijdig ophalen; de voortgang loopt op per afgerond kenteken
+    unieke_kentekens = list(dict.fromkeys(kenteken_list))
+    klaar = []
+    def update_progress(kenteken, car_data, wb_str):
+        klaar.append(kenteken)
+        progress_bar.progress(len(klaar) / len(unieke_kentekens))
+    pipeline.ophalen(unieke_kentekens, on_done=update_progress)
+    
+    # Invoertabel opbouwen: één rij per auto, in de volgorde van de invoer.
+    # Auto's waarvan de invoer (RDW-record, wegenbelasting, overrides en
+    # stamdata) sinds de vorige rerun niet veranderde, komen uit de memo.
+    memo = st.session_state.setdefault("kosten_memo", {})
+    per_kenteken = {}
+    fingerprints = {}
+    voertuigen = []
+    for kenteken in kenteken_list:
+        car_data = get_all_rdw_data(kenteken)
+        if "error" in car_data:
+            waarschuwingen.append(f"⚠️ Fout bij ophalen data voor {kenteken}: {car_data['error']}")
+            tijdelijke_fouten = tijdelijke_fouten or cache.is_fout(car_data)
+            continue
+    
+        wb_str = get_overijssel_price(kenteken)
+        effectief = kosten.effectieve_overrides(st.session_state.overrides, kenteken, car_data.get("catalogusprijs"))
+        fingerprint = (
+            cache.rdw_cache.version(normalize_kenteken(kenteken)),
+            wb_str,
+            effectief,
+            stamdata_key,
+        )
+        memo_entry = memo.get(kenteken)
+        if memo_entry is not None and memo_entry[0] == fingerprint:
+            per_kenteken[kenteken] = memo_entry[1]
+            continue
+        fingerprints[kenteken] = fingerprint
+        voertuigen.append((kenteken, car_data, wb_str, effectief))
+    
+    # Berekeningen voor alle gewijzigde auto's tegelijk
+    for resultaat in pipeline.bereken(voertuigen, stamdata_key):
+        memo[resultaat.kenteken] = (fingerprints[resultaat.kenteken], resultaat)
+        per_kenteken[resultaat.kenteken] = resultaat
+    results = [per_kenteken[k] for k in kenteken_list if k in per_kenteken]
+    if memo_opschonen:
+        for kenteken in [k for k in memo if k not in per_kenteken]:
+            del memo[kenteken]
+    
+    progress_bar.empty()
+    return results, waarschuwingen, tijdelijke_fouten
+
+def importeer_vlootbestand(bestand, stamdata_key):
+    """
+    Verwerk een geüpload wagenparkbestand in chunks en geef de kentekenlijst terug.
+
+    Overrides uit het bestand komen in ``st.session_state.overrides``; per
+    chunk wordt opgehaald en gerekend en groeit de tussenstand op het scherm.
+    Het eindresultaat komt als resultaat-artifact in de sessie, zodat de
+    hoofdflow het zonder nieuwe berekening toont.
+    """
+    kenteken_list = []
+    results = []
+    waarschuwingen = []
+    tijdelijke_fouten = False
+    voortgang = st.empty()
+    tussenstand = st.empty()
+    tussenstand_rijen = []
+    for chunk in vloot_import.lees_chunks(bestand, bestand.name):
+        chunk_kentekens, chunk_overrides = vloot_import.verwerk_chunk(chunk)
+        st.session_state.overrides.update(chunk_overrides)
+        chunk_results, chunk_waarschuwingen, chunk_fouten = bereken_resultaten(
+            chunk_kentekens, stamdata_key, memo_opschonen=False
+        )
+        kenteken_list.extend(chunk_kentekens)
+        results.extend(chunk_results)
+        waarschuwingen.extend(chunk_waarschuwingen)
+        tijdelijke_fouten = tijdelijke_fouten or chunk_fouten
+        tussenstand_rijen.extend(format_resultaat(r) for r in chunk_results)
+        voortgang.info(f"📁 {len(kenteken_list)} kentekens verwerkt, {len(results)} resultaten...")
+        if tussenstand_rijen:
+            tussenstand.dataframe(
+                pd.DataFrame(tussenstand_rijen)[['Kenteken', 'Merk', 'Model', 'Totale kosten p/m incl brandstof', 'Leaseprijs incl brandstof', 'Verschil lease-koop']],
+                use_container_width=True,
+                hide_index=True,
+            )
+    voortgang.empty()
+    tussenstand.empty()
+
+    # Memo-items van auto's die niet meer in het bestand staan opruimen
+    memo = st.session_state.setdefault("kosten_memo", {})
+    for kenteken in set(memo) - set(kenteken_list):
+        del memo[kenteken]
+
+    st.session_state.resultaat_artifact = {
+        "key": resultaat_sleutel(kenteken_list, stamdata_key),
+        "results": results,
+        "waarschuwingen": waarschuwingen,
+        "tijdelijke_fouten": tijdelijke_fouten,
+        "gemaakt_op": time.time(),
+    }
+    return kenteken_list
 
 #########################################
 # Visualisatie functies
 #########################################
 
-def create_cost_comparison_chart(results):
-    """Maak een moderne vergelijkingsgrafiek voor kosten."""
+def format_euro(bedrag: float) -> str:
+    return f"€ {bedrag:,.2f}"
+
+def format_resultaat(r: kosten.KostenResultaat) -> Dict[str, Any]:
+    """Maak de weergaveversie (strings met € en eenheden) van een resultaat."""
+    return {
+        'Kenteken': r.kenteken,
+        'Merk': r.merk,
+        'Model': r.model,
+        'Catalogusprijs': format_euro(r.catalogusprijs) if r.catalogusprijs is not None else "Niet gevonden",
+        'Aanschafprijs excl btw': format_euro(r.aanschafwaarde),
+        'Afschrijvings%': f"{r.afschrijving_percentage:.2f}%",
+        'Rijtuigenbelasting': format_euro(r.wegenbelasting),
+        'Onderhoud p/m': format_euro(r.onderhoud_per_maand),
+        'Brandstofverbruik': f"{r.verbruik:.2f} {r.verbruik_eenheid}",
+        'Brandstof p/m': format_euro(r.brandstof_per_maand),
+        'Rente p/m': format_euro(r.rente_per_maand),
+        'Verzekering p/m': format_euro(r.verzekering_per_maand),
+        'Totale kosten p/m excl brandstof': format_euro(r.kosten_excl_brandstof),
+        'Totale kosten p/m incl brandstof': format_euro(r.kosten_incl_brandstof),
+        'Leaseprijs p/m': format_euro(r.leaseprijs),
+        'Leaseprijs incl brandstof': format_euro(r.leaseprijs_incl),
+        'Verschil lease-koop': format_euro(r.verschil),
+        'Bouwjaar': r.bouwjaar,
+        'Gewicht': f"{r.gewicht} kg" if r.gewicht and r.gewicht != "Geen data gevonden" else "Niet gevonden",
+        'Kleur': r.kleur if r.kleur else "Onbekend",
+        'APK': r.apk if r.apk else "Onbekend",
+        'CO2': f"{r.co2} g/km" if r.co2 else "Onbekend",
+        'Fijnstof': f"{r.fijnstof} mg/km" if r.fijnstof else "Onbekend",
+        'Toelating': r.bouwjaar,
+    }
+
+# Tot zoveel auto's krijgt elk kenteken een eigen balkpaar met labels
+GRAFIEK_DETAIL_MAX = 30
+# Aantal groepen (of goedkoopste/duurste auto's) dat los getoond wordt; de rest wordt "Overige"
+GRAFIEK_TOP_N = 10
+# Vanaf zoveel punten tekent de spreidingsgrafiek met WebGL
+WEBGL_DREMPEL = 1000
+KOSTENKLASSE_BREEDTE = 250
+GRAFIEK_GROEPERINGEN = ("Goedkoopste en duurste", "Per merk", "Per model", "Per kostenklasse", "Spreiding (alle auto's)")
+
+def _grafiek_opmaak(fig, titel: str, xaxis_title: str, yaxis_title: str = 'Kosten per maand (€)'):
+    fig.update_layout(
+        title=titel,
+        xaxis_title=xaxis_title,
+        yaxis_title=yaxis_title,
+        barmode='group',
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white'),
+        xaxis=dict(gridcolor='rgba(255,255,255,0.1)'),
+        yaxis=dict(gridcolor='rgba(255,255,255,0.1)'),
+        legend=dict(
+            bgcolor='rgba(0,0,0,0)',
+            bordercolor='rgba(255,255,255,0.1)',
+            borderwidth=1
+        ),
+        margin=dict(t=60, b=40, l=40, r=40),
+        height=400
+    )
+    return fig
+
+def _kosten_tabel(results) -> pd.DataFrame:
+    return pd.DataFrame({
+        'kenteken': [r.kenteken for r in results],
+        'merk': [r.merk for r in results],
+        'model': [f"{r.merk} {r.model}" for r in results],
+        'koop': [r.kosten_incl_brandstof for r in results],
+        'lease': [r.leaseprijs_incl for r in results],
+    })
+
+def _met_overige(groepen: pd.DataFrame, df: pd.DataFrame, kolom: str, top_n: int) -> pd.DataFrame:
+    """De ``top_n`` grootste groepen, plus één groep "Overige" met de rest."""
+    groepen = groepen.sort_values('aantal', ascending=False)
+    if len(groepen) <= top_n + 1:
+        return groepen
+    rest = df[~df[kolom].isin(groepen.index[:top_n])]
+    overige = pd.DataFrame(
+        {'koop': [rest['koop'].mean()], 'lease': [rest['lease'].mean()], 'aantal': [len(rest)]},
+        index=[f"Overige ({groepen.index.size - top_n} groepen)"],
+    )
+    return pd.concat([groepen.iloc[:top_n], overige])
+
+def grafiek_groepen(results, groepering: str, top_n: int = GRAFIEK_TOP_N) -> pd.DataFrame:
+    """
+    Gemiddelde koop- en leasekosten per groep, met het aantal auto's.
+
+    De index is het label van de balk. "Goedkoopste en duurste" toont de
+    ``top_n`` goedkoopste en duurste auto's los, met het midden als "Overige".
+    """
+    df = _kosten_tabel(results)
+    if groepering in ("Per merk", "Per model"):
+        kolom = 'merk' if groepering == "Per merk" else 'model'
+        groepen = df.groupby(kolom).agg(koop=('koop', 'mean'), lease=('lease', 'mean'), aantal=('koop', 'size'))
+        return _met_overige(groepen, df, kolom, top_n)
+    if groepering == "Per kostenklasse":
+        ondergrens = (df['koop'] // KOSTENKLASSE_BREEDTE * KOSTENKLASSE_BREEDTE).astype(int)
+        groepen = df.groupby(ondergrens).agg(koop=('koop', 'mean'), lease=('lease', 'mean'), aantal=('koop', 'size'))
+        groepen.index = [f"€{g:,}–{g + KOSTENKLASSE_BREEDTE:,}" for g in groepen.index]
+        return groepen
+    df = df.sort_values('koop')
+    per_auto = df.set_index('kenteken')[['koop', 'lease']].assign(aantal=1)
+    if len(df) <= 2 * top_n + 1:
+        return per_auto
+    midden = df.iloc[top_n:-top_n]
+    overige = pd.DataFrame(
+        {'koop': [midden['koop'].mean()], 'lease': [midden['lease'].mean()], 'aantal': [len(midden)]},
+        index=[f"Overige ({len(midden)} auto's)"],
+    )
+    return pd.concat([per_auto.iloc[:top_n], overige, per_auto.iloc[-top_n:]])
+
+def create_cost_comparison_chart(results, groepering: str = None):
+    """
+    Maak een moderne vergelijkingsgrafiek voor kosten.
+
+    Tot `GRAFIEK_DETAIL_MAX` auto's één balkpaar per kenteken; daarboven
+    volgens ``groepering`` (zie `grafiek_groepen`), zonder labels per balk
+    zodat de figuur klein blijft.
+    """
+    if groepering is None or len(results) <= GRAFIEK_DETAIL_MAX:
+        return _per_auto_chart(results)
+    if groepering == "Spreiding (alle auto's)":
+        return create_cost_scatter(results)
+
+    groepen = grafiek_groepen(results, groepering)
+    fig = go.Figure()
+    for naam, kolom, kleur in (
+        ('Koopkosten', 'koop', '102, 126, 234'),
+        ('Leasekosten', 'lease', '118, 75, 162'),
+    ):
+        fig.add_trace(go.Bar(
+            name=naam,
+            x=groepen.index,
+            y=groepen[kolom],
+            customdata=groepen['aantal'],
+            hovertemplate="%{x}<br>€%{y:,.0f} gemiddeld<br>%{customdata} auto('s)<extra></extra>",
+            marker_color=f'rgba({kleur}, 0.8)',
+            marker_line_color=f'rgba({kleur}, 1)',
+            marker_line_width=1.5,
+        ))
+    return _grafiek_opmaak(fig, f'Gemiddelde kosten: {groepering.lower()}', '', 'Gemiddelde kosten per maand (€)')
+
+def create_cost_scatter(results):
+    """Koop- tegen leasekosten per auto; boven `WEBGL_DREMPEL` punten met WebGL."""
+    df = _kosten_tabel(results)
+    trace = go.Scattergl if len(df) > WEBGL_DREMPEL else go.Scatter
+    fig = go.Figure()
+    fig.add_trace(trace(
+        x=df['koop'],
+        y=df['lease'],
+        mode='markers',
+        text=df['kenteken'],
+        hovertemplate="%{text}<br>Koop €%{x:,.0f}<br>Lease €%{y:,.0f}<extra></extra>",
+        marker=dict(color='rgba(102, 126, 234, 0.6)', size=6),
+        showlegend=False,
+    ))
+    # Boven de lijn is kopen goedkoper dan leasen
+    grens = [0, max(df['koop'].max(), df['lease'].max())]
+    fig.add_trace(go.Scatter(
+        x=grens, y=grens, mode='lines', hoverinfo='skip', showlegend=False,
+        line=dict(color='rgba(255,255,255,0.3)', dash='dash'),
+    ))
+    return _grafiek_opmaak(fig, 'Koop- tegen leasekosten per auto', 'Koopkosten per maand (€)', 'Leasekosten per maand (€)')
+
+def _per_auto_chart(results):
     fig = go.Figure()
     
     # Data prepareren
-    kentekens = [r['Kenteken'] for r in results]
-    koop_kosten = [float(r['Totale kosten p/m incl brandstof'].replace("€", "").replace(",", "")) for r in results]
-    lease_kosten = [float(r['Leaseprijs incl brandstof'].replace("€", "").replace(",", "")) for r in results]
+    kentekens = [r.kenteken for r in results]
+    koop_kosten = [r.kosten_incl_brandstof for r in results]
+    lease_kosten = [r.leaseprijs_incl for r in results]
     
     # Bars toevoegen
     fig.add_trace(go.Bar(
@@ -399,40 +666,15 @@ def create_cost_comparison_chart(results):
         textposition='outside',
     ))
     
-    # Layout aanpassen
-    fig.update_layout(
-        title='Kostenvergelijking per Auto',
-        xaxis_title='Kenteken',
-        yaxis_title='Kosten per maand (€)',
-        barmode='group',
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(color='white'),
-        xaxis=dict(gridcolor='rgba(255,255,255,0.1)'),
-        yaxis=dict(gridcolor='rgba(255,255,255,0.1)'),
-        legend=dict(
-            bgcolor='rgba(0,0,0,0)',
-            bordercolor='rgba(255,255,255,0.1)',
-            borderwidth=1
-        ),
-        margin=dict(t=60, b=40, l=40, r=40),
-        height=400
-    )
-    
-    return fig
+    return _grafiek_opmaak(fig, 'Kostenvergelijking per Auto', 'Kenteken')
 
 def create_cost_breakdown_pie(result):
     """Maak een pie chart voor kostenverdeling."""
-    # Extract costs
-    afschrijving = float(result['Aanschafprijs excl btw'].replace("€", "").replace(",", "")) * (float(result['Afschrijvings%'].replace("%", "")) / 100) / 12
-    rente = float(result['Rente p/m'].replace("€", "").replace(",", ""))
-    verzekering = float(result['Verzekering p/m'].replace("€", "").replace(",", ""))
-    onderhoud = float(result['Onderhoud p/m'].replace("€", "").replace(",", ""))
-    belasting = float(result['Rijtuigenbelasting'].replace("€", "").replace(",", ""))
-    brandstof = float(result['Brandstof p/m'].replace("€", "").replace(",", ""))
-    
     labels = ['Afschrijving', 'Rente', 'Verzekering', 'Onderhoud', 'Wegenbelasting', 'Brandstof']
-    values = [afschrijving, rente, verzekering, onderhoud, belasting, brandstof]
+    values = [
+        result.afschrijving_per_maand, result.rente_per_maand, result.verzekering_per_maand,
+        result.onderhoud_per_maand, result.wegenbelasting, result.brandstof_per_maand,
+    ]
     
     fig = go.Figure(data=[go.Pie(
         labels=labels,
@@ -457,6 +699,219 @@ def create_cost_breakdown_pie(result):
     
     return fig
 
+#########################################
+# Auto-specifieke instellingen
+#########################################
+
+# Aantal auto's per pagina in de weergave per auto; alleen die krijgen widgets
+AUTOS_PER_PAGINA = 20
+# (prefix van de override-sleutel, kolom in de tabel, veld van KostenResultaat)
+INSTELLING_KOLOMMEN = (
+    ("aanschaf", "Aanschafprijs excl btw (€)", "aanschafwaarde"),
+    ("afschrijving", "Afschrijving p/j (%)", "afschrijving_percentage"),
+    ("lease", "Leaseprijs p/m (€)", "leaseprijs"),
+    ("verzekering", "Verzekering p/m (€)", "verzekering_per_maand"),
+    ("onderhoud", "Onderhoud p/m (€)", "onderhoud_per_maand"),
+)
+
+def toon_auto_instellingen(res):
+    """Expander met de overrides en voertuigdetails van één auto."""
+    kenteken = res.kenteken
+    merk = res.merk
+    model = res.model
+    
+    # Status bepalen
+    verschil_val = res.verschil
+    if verschil_val < -100:
+        status_class = "status-success"
+        status_text = "Lease voordelig"
+    elif verschil_val > 100:
+        status_class = "status-danger"
+        status_text = "Koop voordelig"
+    else:
+        status_class = "status-warning"
+        status_text = "Vergelijkbaar"
+    
+    # Overrides alleen schrijven als de waarde afwijkt van wat in de
+    # berekening zat, zodat openen/renderen de resultaatset niet ongeldig maakt
+    with st.expander(f"🚗 {merk} - {model} - {kenteken}"):
+        st.markdown(f'<span class="status-pill {status_class}">{status_text}</span>', unsafe_allow_html=True)
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown("**💰 Financiële instellingen**")
+            
+            new_aanschaf = st.number_input(
+                "Aanschafprijs excl btw (€)",
+                value=st.session_state.overrides.get(
+                    f'aanschaf_{kenteken}', 
+                    res.aanschafwaarde
+                ),
+                key=f"aanschaf_{kenteken}_exp",
+                format="%.2f"
+            )
+            if new_aanschaf != res.aanschafwaarde:
+                st.session_state.overrides[f'aanschaf_{kenteken}'] = new_aanschaf
+            
+            new_afschrijving = st.number_input(
+                "Afschrijvingspercentage per jaar (%)",
+                value=st.session_state.overrides.get(
+                    f'afschrijving_{kenteken}', 
+                    res.afschrijving_percentage
+                ),
+                min_value=0.0,
+                max_value=100.0,
+                key=f"afschrijving_{kenteken}_exp",
+                format="%.1f"
+            )
+            if new_afschrijving != res.afschrijving_percentage:
+                st.session_state.overrides[f'afschrijving_{kenteken}'] = new_afschrijving
+            
+            new_leaseprijs = st.number_input(
+                "Leaseprijs p/m (€)",
+                value=st.session_state.overrides.get(
+                    f'lease_{kenteken}', 
+                    res.leaseprijs
+                ),
+                min_value=0.0,
+                key=f"lease_{kenteken}_exp",
+                format="%.2f"
+            )
+            if new_leaseprijs != res.leaseprijs:
+                st.session_state.overrides[f'lease_{kenteken}'] = new_leaseprijs
+        
+        with col2:
+            st.markdown("**🛡️ Verzekering & Onderhoud**")
+            
+            new_verzekering = st.number_input(
+                "Verzekering p/m (€)",
+                value=st.session_state.overrides.get(
+                    f'verzekering_{kenteken}', 
+                    res.verzekering_per_maand
+                ),
+                min_value=0.0,
+                key=f"verzekering_{kenteken}_exp",
+                format="%.2f"
+            )
+            if new_verzekering != res.verzekering_per_maand:
+                st.session_state.overrides[f'verzekering_{kenteken}'] = new_verzekering
+            
+            new_onderhoud = st.number_input(
+                "Onderhoud p/m (€)",
+                value=st.session_state.overrides.get(
+                    f'onderhoud_{kenteken}', 
+                    res.onderhoud_per_maand
+                ),
+                min_value=0.0,
+                key=f"onderhoud_{kenteken}_exp",
+                format="%.2f"
+            )
+            if new_onderhoud != res.onderhoud_per_maand:
+                st.session_state.overrides[f'onderhoud_{kenteken}'] = new_onderhoud
+            
+            if st.button("💾 Aanpassingen opslaan", key=f"save_{kenteken}"):
+                save_persistent_data(immediate=True)
+                st.success("✅ Opgeslagen!")
+                time.sleep(0.5)
+                st.rerun()
+        
+        # Extra details in een mooie tabel
+        st.markdown("---")
+        st.markdown("**📄 Voertuigdetails**")
+        
+        details = format_resultaat(res)
+        detail_col1, detail_col2, detail_col3 = st.columns(3)
+        with detail_col1:
+            st.metric("Bouwjaar", details['Bouwjaar'])
+            st.metric("Kleur", details['Kleur'])
+        with detail_col2:
+            st.metric("Gewicht", details['Gewicht'])
+            st.metric("APK", details['APK'])
+        with detail_col3:
+            st.metric("CO2 Uitstoot", details['CO2'])
+            st.metric("Fijnstof", details['Fijnstof'])
+
+def toon_instellingen_per_auto(results):
+    """Expanders per auto, gefilterd op een zoekterm en per pagina van `AUTOS_PER_PAGINA`."""
+    zoekterm = st.text_input(
+        "🔍 Zoek op kenteken, merk of model",
+        key="instellingen_zoekterm",
+    ).strip().upper()
+    if zoekterm:
+        results = [
+            r for r in results
+            if normalize_kenteken(zoekterm) in r.kenteken or zoekterm in f"{r.merk} {r.model}".upper()
+        ]
+    if not results:
+        st.info("Geen auto's gevonden voor deze zoekterm.")
+        return
+
+    aantal_paginas = -(-len(results) // AUTOS_PER_PAGINA)
+    pagina = 1
+    if aantal_paginas > 1:
+        pagina = st.number_input(
+            f"Pagina (van {aantal_paginas})",
+            min_value=1,
+            max_value=aantal_paginas,
+            value=1,
+            step=1,
+            key="instellingen_pagina",
+        )
+    begin = (pagina - 1) * AUTOS_PER_PAGINA
+    zichtbaar = results[begin:begin + AUTOS_PER_PAGINA]
+    st.caption(f"Auto {begin + 1}–{begin + len(zichtbaar)} van {len(results)}")
+    for res in zichtbaar:
+        toon_auto_instellingen(res)
+
+def toon_instellingen_tabel(results):
+    """
+    Alle overrides in één bewerkbare tabel.
+
+    De tabel staat in een formulier, zodat bewerken geen rerun geeft; bij
+    opslaan worden alleen de gewijzigde cellen als override geschreven.
+    """
+    df = pd.DataFrame([
+        {
+            'Kenteken': r.kenteken,
+            'Merk': r.merk,
+            'Model': r.model,
+            **{kolom: getattr(r, veld) for _, kolom, veld in INSTELLING_KOLOMMEN},
+        }
+        for r in results
+    ])
+    with st.form("instellingen_tabel"):
+        bewerkt = st.data_editor(
+            df,
+            column_config={
+                "Aanschafprijs excl btw (€)": st.column_config.NumberColumn(min_value=0.0, format="€ %.2f"),
+                "Afschrijving p/j (%)": st.column_config.NumberColumn(min_value=0.0, max_value=100.0, format="%.1f%%"),
+                "Leaseprijs p/m (€)": st.column_config.NumberColumn(min_value=0.0, format="€ %.2f"),
+                "Verzekering p/m (€)": st.column_config.NumberColumn(min_value=0.0, format="€ %.2f"),
+                "Onderhoud p/m (€)": st.column_config.NumberColumn(min_value=0.0, format="€ %.2f"),
+            },
+            disabled=["Kenteken", "Merk", "Model"],
+            num_rows="fixed",
+            hide_index=True,
+            use_container_width=True,
+            key="instellingen_editor",
+        )
+        opslaan = st.form_submit_button("💾 Alle aanpassingen opslaan")
+
+    if opslaan:
+        gewijzigd = {}
+        for res, rij in zip(results, bewerkt.to_dict("records")):
+            for prefix, kolom, veld in INSTELLING_KOLOMMEN:
+                nieuw = rij[kolom]
+                # Een leeggemaakte cel laat de bestaande waarde staan
+                if not pd.isna(nieuw) and nieuw != getattr(res, veld):
+                    gewijzigd[f'{prefix}_{res.kenteken}'] = float(nieuw)
+        if gewijzigd:
+            st.session_state.overrides.update(gewijzigd)
+            save_persistent_data(immediate=True)
+            st.rerun()
+        st.info("Geen wijzigingen om op te slaan.")
+
 #########################################
 # Hoofdapplicatie
 #########################################
@@ -557,7 +1012,7 @@ with st.sidebar:
     
     # Save button
     if st.button("💾 Instellingen Opslaan", use_container_width=True):
-        save_persistent_data()
+        save_persistent_data(immediate=True)
         st.success("✅ Opgeslagen!")
 
 # Main content
@@ -571,102 +1026,54 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 kentekens = st.text_area("", height=100, placeholder="Bijvoorbeeld:\nAB-123-CD\nEF-456-GH")
+vlootbestand = st.file_uploader(
+    "📁 Of upload een wagenparkbestand (CSV of Excel)",
+    type=["csv", "xlsx"],
+    help="Verplichte kolom: kenteken. Optioneel: aanschafprijs, afschrijving, leaseprijs, verzekering en onderhoud.",
+)
 
-if kentekens:
-    with st.spinner('🔄 Data ophalen en berekeningen uitvoeren...'):
-        kenteken_list = [k.strip().upper() for k in kentekens.split('\n') if k.strip()]
-        results = []
-        
-        # Progress bar
-        progress_bar = st.progress(0)
-        
-        for idx, kenteken in enumerate(kenteken_list):
-            progress_bar.progress((idx + 1) / len(kenteken_list))
-            
-            car_data = get_all_rdw_data(kenteken)
-            if "error" in car_data:
-                st.warning(f"⚠️ Fout bij ophalen data voor {kenteken}: {car_data['error']}")
-                continue
-            
-            catalogusprijs = car_data.get("catalogusprijs")
-            merk = car_data.get("merk", "Onbekend")
-            model = car_data.get("handelsbenaming", "Onbekend")
-            
-            # Overrides en standaardwaarden
-            aanschafwaarde = st.session_state.overrides.get(
-                f'aanschaf_{kenteken}', 
-                float(catalogusprijs) if catalogusprijs and catalogusprijs != "Geen data gevonden" else 15000.00
-            )
-            afschrijving_percentage = st.session_state.overrides.get(f'afschrijving_{kenteken}', 15.0)
-            verzekering_per_maand = st.session_state.overrides.get(f'verzekering_{kenteken}', 200.0)
-            leaseprijs = st.session_state.overrides.get(f'lease_{kenteken}', 0.0)
-            onderhoud_per_maand = st.session_state.overrides.get(f'onderhoud_{kenteken}', 80.0)
-            
-            bouwjaar = car_data.get("datum_eerste_toelating")
-            gewicht = car_data.get("massa_rijklaar")
-            kleur = car_data.get("eerste_kleur")
-            apk = car_data.get("vervaldatum_apk")
-            brandstof = car_data.get("brandstof_omschrijving")
-            co2 = car_data.get("co2_uitstoot_gecombineerd")
-            if co2 is None or co2 == "Veld niet gevonden":
-                co2 = car_data.get("co2_uitstoot_nettomax")
-            fijnstof = car_data.get("uitstoot_deeltjes_licht")
-            toelating = car_data.get("datum_eerste_toelating")
-            
-            # Rijtuigenbelasting
-            wb_str = get_overijssel_price(kenteken)
-            try:
-                if wb_str.startswith("€"):
-                    wb_numeric = float(wb_str.split(" ")[1].replace(",", "."))
-                else:
-                    wb_numeric = float(wb_str.replace(",", "."))
-            except Exception:
-                wb_numeric = 0.0
-            
-            # Berekeningen
-            afschrijving_per_maand_calc = (aanschafwaarde * (afschrijving_percentage / 100)) / 12
-            verbruik = get_rdw_brandstof_verbruik(kenteken)
-            if brandstof and "ELEKTR" in brandstof.upper():
-                kosten_brandstof_per_jaar = (jaarlijkse_km / 100) * verbruik * elektraprijs
-            else:
-                kosten_brandstof_per_jaar = (jaarlijkse_km / 100) * verbruik * brandstofprijs
-            brandstof_per_maand = kosten_brandstof_per_jaar / 12
-            rente_per_jaar = aanschafwaarde * (rente / 100)
-            rente_per_maand = rente_per_jaar / 12
-            
-            kosten_excl_brandstof = afschrijving_per_maand_calc + rente_per_maand + verzekering_per_maand + onderhoud_per_maand + wb_numeric
-            kosten_incl_brandstof = kosten_excl_brandstof + brandstof_per_maand
-            leaseprijs_incl = leaseprijs + brandstof_per_maand
-            verschil = leaseprijs_incl - kosten_incl_brandstof
-            
-            results.append({
-                'Kenteken': kenteken,
-                'Merk': merk,
-                'Model': model,
-                'Catalogusprijs': f"€ {float(catalogusprijs):,.2f}" if catalogusprijs and catalogusprijs != "Geen data gevonden" else "Niet gevonden",
-                'Aanschafprijs excl btw': f"€ {aanschafwaarde:,.2f}",
-                'Afschrijvings%': f"{afschrijving_percentage:.2f}%",
-                'Rijtuigenbelasting': f"€ {wb_numeric:,.2f}",
-                'Onderhoud p/m': f"€ {onderhoud_per_maand:,.2f}",
-                'Brandstofverbruik': f"{verbruik:.2f} L/100km" if brandstof and "ELEKTR" not in brandstof.upper() else f"{verbruik:.2f} kWh/100km",
-                'Brandstof p/m': f"€ {brandstof_per_maand:,.2f}",
-                'Rente p/m': f"€ {rente_per_maand:,.2f}",
-                'Verzekering p/m': f"€ {verzekering_per_maand:,.2f}",
-                'Totale kosten p/m excl brandstof': f"€ {kosten_excl_brandstof:,.2f}",
-                'Totale kosten p/m incl brandstof': f"€ {kosten_incl_brandstof:,.2f}",
-                'Leaseprijs p/m': f"€ {leaseprijs:,.2f}",
-                'Leaseprijs incl brandstof': f"€ {leaseprijs_incl:,.2f}",
-                'Verschil lease-koop': f"€ {verschil:,.2f}",
-                'Bouwjaar': bouwjaar,
-                'Gewicht': f"{gewicht} kg" if gewicht and gewicht != "Geen data gevonden" else "Niet gevonden",
-                'Kleur': kleur if kleur else "Onbekend",
-                'APK': apk if apk else "Onbekend",
-                'CO2': f"{co2} g/km" if co2 else "Onbekend",
-                'Fijnstof': f"{fijnstof} mg/km" if fijnstof else "Onbekend",
-                'Toelating': toelating
-            })
-        
-        progress_bar.empty()
+stamdata_key = (jaarlijkse_km, brandstofprijs, elektraprijs, rente)
+kenteken_list = None
+if vlootbestand is not None:
+    # Een bestand wordt één keer geïmporteerd; daarna geldt de kentekenlijst
+    # ervan als invoer, zodat aanpassingen in de app niet overschreven worden.
+    if st.session_state.get("vloot_bestand_id") != vlootbestand.file_id:
+        try:
+            with st.spinner('📁 Wagenparkbestand verwerken...'):
+                st.session_state.vloot_kentekens = importeer_vlootbestand(vlootbestand, stamdata_key)
+            st.session_state.vloot_bestand_id = vlootbestand.file_id
+        except vloot_import.VlootImportFout as e:
+            st.error(f"❌ {e}")
+    if st.session_state.get("vloot_bestand_id") == vlootbestand.file_id:
+        kenteken_list = st.session_state.vloot_kentekens
+elif kentekens:
+    kenteken_list = [k.strip().upper() for k in kentekens.split('\n') if k.strip()]
+
+if kenteken_list is not None:
+    
+    # Alleen opnieuw ophalen en rekenen als de invoer veranderde; pure
+    # weergave-interacties (selectbox, expanders) hergebruiken de resultaatset.
+    # Na een tijdelijke fout na de fout-TTL opnieuw proberen; "niet gevonden" blijft staan.
+    artifact = st.session_state.get("resultaat_artifact")
+    if (
+        artifact is None
+        or artifact["key"] != resultaat_sleutel(kenteken_list, stamdata_key)
+        or (artifact.get("tijdelijke_fouten") and time.time() - artifact["gemaakt_op"] > cache.FOUT_TTL)
+    ):
+        with st.spinner('🔄 Data ophalen en berekeningen uitvoeren...'):
+            results, waarschuwingen, tijdelijke_fouten = bereken_resultaten(kenteken_list, stamdata_key)
+        artifact = {
+            # Na het ophalen bepaald, omdat het ophalen de caches bijwerkt
+            "key": resultaat_sleutel(kenteken_list, stamdata_key),
+            "results": results,
+            "waarschuwingen": waarschuwingen,
+            "tijdelijke_fouten": tijdelijke_fouten,
+            "gemaakt_op": time.time(),
+        }
+        st.session_state.resultaat_artifact = artifact
+    results = artifact["results"]
+    for waarschuwing in artifact["waarschuwingen"]:
+        st.warning(waarschuwing)
     
     if results:
         # Summary cards
@@ -679,7 +1086,7 @@ if kentekens:
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            avg_koop = sum([float(r['Totale kosten p/m incl brandstof'].replace("€", "").replace(",", "")) for r in results]) / len(results)
+            avg_koop = sum(r.kosten_incl_brandstof for r in results) / len(results)
             st.markdown(f"""
             <div class="metric-card">
                 <div class="metric-label">Gem. Koopkosten</div>
@@ -689,7 +1096,7 @@ if kentekens:
             """, unsafe_allow_html=True)
         
         with col2:
-            avg_lease = sum([float(r['Leaseprijs incl brandstof'].replace("€", "").replace(",", "")) for r in results]) / len(results)
+            avg_lease = sum(r.leaseprijs_incl for r in results) / len(results)
             st.markdown(f"""
             <div class="metric-card">
                 <div class="metric-label">Gem. Leasekosten</div>
@@ -699,17 +1106,17 @@ if kentekens:
             """, unsafe_allow_html=True)
         
         with col3:
-            beste_deal = min(results, key=lambda x: float(x['Verschil lease-koop'].replace("€", "").replace(",", "")))
+            beste_deal = min(results, key=lambda x: x.verschil)
             st.markdown(f"""
             <div class="metric-card">
                 <div class="metric-label">Beste Deal</div>
-                <div class="metric-value">{beste_deal['Merk']}</div>
-                <div class="metric-label">{beste_deal['Kenteken']}</div>
+                <div class="metric-value">{beste_deal.merk}</div>
+                <div class="metric-label">{beste_deal.kenteken}</div>
             </div>
             """, unsafe_allow_html=True)
         
         with col4:
-            aantal_voordelig = len([r for r in results if float(r['Verschil lease-koop'].replace("€", "").replace(",", "")) < 0])
+            aantal_voordelig = len([r for r in results if r.verschil < 0])
             st.markdown(f"""
             <div class="metric-card">
                 <div class="metric-label">Lease Voordeliger</div>
@@ -727,18 +1134,23 @@ if kentekens:
         
         col1, col2 = st.columns(2)
         with col1:
-            fig = create_cost_comparison_chart(results)
-            st.plotly_chart(fig, use_container_width=True)
+            groepering = None
+            if len(results) > GRAFIEK_DETAIL_MAX:
+                groepering = st.selectbox("Weergave kostenvergelijking:", GRAFIEK_GROEPERINGEN, key="grafiek_groepering")
+            with metrics.meet("plotly_render"):
+                fig = create_cost_comparison_chart(results, groepering)
+                st.plotly_chart(fig, use_container_width=True)
         
         with col2:
             if results:
                 selected_car = st.selectbox(
                     "Selecteer auto voor kostenverdeling:",
-                    [f"{r['Merk']} - {r['Model']} ({r['Kenteken']})" for r in results]
+                    [f"{r.merk} - {r.model} ({r.kenteken})" for r in results]
                 )
-                selected_idx = [f"{r['Merk']} - {r['Model']} ({r['Kenteken']})" for r in results].index(selected_car)
-                fig_pie = create_cost_breakdown_pie(results[selected_idx])
-                st.plotly_chart(fig_pie, use_container_width=True)
+                selected_idx = [f"{r.merk} - {r.model} ({r.kenteken})" for r in results].index(selected_car)
+                with metrics.meet("plotly_render"):
+                    fig_pie = create_cost_breakdown_pie(results[selected_idx])
+                    st.plotly_chart(fig_pie, use_container_width=True)
         
         # Gedetailleerde tabel
         st.markdown("""
@@ -747,7 +1159,7 @@ if kentekens:
         </div>
         """, unsafe_allow_html=True)
         
-        df = pd.DataFrame(results)
+        df = pd.DataFrame([format_resultaat(r) for r in results])
         main_columns = [
             "Kenteken", "Merk", "Model", "Totale kosten p/m incl brandstof",
             "Leaseprijs incl brandstof", "Verschil lease-koop"
@@ -770,120 +1182,25 @@ if kentekens:
         </div>
         """, unsafe_allow_html=True)
         
-        for idx, res in enumerate(results):
-            kenteken = res['Kenteken']
-            merk = res['Merk']
-            model = res['Model']
-            
-            # Status bepalen
-            verschil_val = float(res['Verschil lease-koop'].replace("€", "").replace(",", ""))
-            if verschil_val < -100:
-                status_class = "status-success"
-                status_text = "Lease voordelig"
-            elif verschil_val > 100:
-                status_class = "status-danger"
-                status_text = "Koop voordelig"
-            else:
-                status_class = "status-warning"
-                status_text = "Vergelijkbaar"
-            
-            with st.expander(f"🚗 {merk} - {model} - {kenteken}"):
-                st.markdown(f'<span class="status-pill {status_class}">{status_text}</span>', unsafe_allow_html=True)
-                
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.markdown("**💰 Financiële instellingen**")
-                    
-                    new_aanschaf = st.number_input(
-                        "Aanschafprijs excl btw (€)",
-                        value=st.session_state.overrides.get(
-                            f'aanschaf_{kenteken}', 
-                            float(res['Aanschafprijs excl btw'].replace("€", "").replace(",", "")) if res['Aanschafprijs excl btw'] != "Niet gevonden" else 15000.00
-                        ),
-                        key=f"aanschaf_{kenteken}_exp",
-                        format="%.2f"
-                    )
-                    st.session_state.overrides[f'aanschaf_{kenteken}'] = new_aanschaf
-                    
-                    new_afschrijving = st.number_input(
-                        "Afschrijvingspercentage per jaar (%)",
-                        value=st.session_state.overrides.get(
-                            f'afschrijving_{kenteken}', 
-                            float(res['Afschrijvings%'].replace("%", "")) if res['Afschrijvings%'] != "Onbekend" else 15.0
-                        ),
-                        min_value=0.0,
-                        max_value=100.0,
-                        key=f"afschrijving_{kenteken}_exp",
-                        format="%.1f"
-                    )
-                    st.session_state.overrides[f'afschrijving_{kenteken}'] = new_afschrijving
-                    
-                    new_leaseprijs = st.number_input(
-                        "Leaseprijs p/m (€)",
-                        value=st.session_state.overrides.get(
-                            f'lease_{kenteken}', 
-                            float(res['Leaseprijs p/m'].replace("€", "").replace(",", "")) if res['Leaseprijs p/m'] != "Niet gevonden" else 0.0
-                        ),
-                        min_value=0.0,
-                        key=f"lease_{kenteken}_exp",
-                        format="%.2f"
-                    )
-                    st.session_state.overrides[f'lease_{kenteken}'] = new_leaseprijs
-                
-                with col2:
-                    st.markdown("**🛡️ Verzekering & Onderhoud**")
-                    
-                    new_verzekering = st.number_input(
-                        "Verzekering p/m (€)",
-                        value=st.session_state.overrides.get(
-                            f'verzekering_{kenteken}', 
-                            float(res['Verzekering p/m'].replace("€", "").replace(",", "")) if res['Verzekering p/m'] != "Niet gevonden" else 200.0
-                        ),
-                        min_value=0.0,
-                        key=f"verzekering_{kenteken}_exp",
-                        format="%.2f"
-                    )
-                    st.session_state.overrides[f'verzekering_{kenteken}'] = new_verzekering
-                    
-                    new_onderhoud = st.number_input(
-                        "Onderhoud p/m (€)",
-                        value=st.session_state.overrides.get(
-                            f'onderhoud_{kenteken}', 
-                            80.0
-                        ),
-                        min_value=0.0,
-                        key=f"onderhoud_{kenteken}_exp",
-                        format="%.2f"
-                    )
-                    st.session_state.overrides[f'onderhoud_{kenteken}'] = new_onderhoud
-                    
-                    if st.button("💾 Aanpassingen opslaan", key=f"save_{kenteken}"):
-                        save_persistent_data()
-                        st.success("✅ Opgeslagen!")
-                        time.sleep(0.5)
-                        st.rerun()
-                
-                # Extra details in een mooie tabel
-                st.markdown("---")
-                st.markdown("**📄 Voertuigdetails**")
-                
-                detail_col1, detail_col2, detail_col3 = st.columns(3)
-                with detail_col1:
-                    st.metric("Bouwjaar", res['Bouwjaar'])
-                    st.metric("Kleur", res['Kleur'])
-                with detail_col2:
-                    st.metric("Gewicht", res['Gewicht'])
-                    st.metric("APK", res['APK'])
-                with detail_col3:
-                    st.metric("CO2 Uitstoot", res['CO2'])
-                    st.metric("Fijnstof", res['Fijnstof'])
+        weergave = st.radio(
+            "Weergave",
+            ["Per auto", "Tabel (alles tegelijk)"],
+            horizontal=True,
+            key="instellingen_weergave",
+            label_visibility="collapsed",
+        )
+        if weergave == "Per auto":
+            toon_instellingen_per_auto(results)
+        else:
+            toon_instellingen_tabel(results)
     else:
         st.warning("⚠️ Geen geldige resultaten gevonden voor de ingevoerde kentekens.")
 
 # Auto-save
 if st.session_state.authenticated:
     save_persistent_data()
+    show_debug_panel()
+    metrics.exporteer()
 
 # Footer
 st.markdown("""
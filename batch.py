@@ -0,0 +1,194 @@
+"""Batchmodus: bereken de kosten van een wagenpark zonder Streamlit, bijv. vanuit cron.
+
+De kentekens komen van de opdrachtregel, uit een wagenparkbestand (zie
+vloot_import.py) of, als geen van beide is opgegeven, uit de overrides in de
+opgeslagen data. Overrides en stamdata komen uit ``data.db`` (of een oud
+``data.json``); stamdata is per waarde te overschrijven. De kentekens worden in
+chunks opgehaald en berekend en de rijen direct weggeschreven, zodat looptijd
+en geheugen lineair met het wagenpark meegroeien.
+
+Voorbeelden (vanuit de root van de repo):
+
+    python batch.py AB-123-CD EF-456-GH
+    python batch.py --bestand wagenpark.xlsx -o rapport.parquet
+    python batch.py --data data.db --rente 4.5 -o rapport.jsonl
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+from dataclasses import asdict, fields
+from typing import Any, Dict, Iterator, List, Tuple
+
+import cache
+import kosten
+import pipeline
+import storage
+import vloot_import
+
+logger = logging.getLogger("batch")
+
+KOLOMMEN = [f.name for f in fields(kosten.KostenResultaat)]
+FORMATEN = ("csv", "jsonl", "parquet")
+
+
+class CsvSchrijver:
+    def __init__(self, uitvoer):
+        self._writer = csv.DictWriter(uitvoer, fieldnames=KOLOMMEN)
+        self._writer.writeheader()
+
+    def schrijf(self, rijen: List[Dict[str, Any]]) -> None:
+        self._writer.writerows(rijen)
+
+    def sluit(self) -> None:
+        pass
+
+
+class JsonlSchrijver:
+    def __init__(self, uitvoer):
+        self._uitvoer = uitvoer
+
+    def schrijf(self, rijen: List[Dict[str, Any]]) -> None:
+        for rij in rijen:
+            self._uitvoer.write(json.dumps(rij, ensure_ascii=False) + "\n")
+
+    def sluit(self) -> None:
+        pass
+
+
+class ParquetSchrijver:
+    """Schrijft elke chunk als row group, zodat nooit het hele rapport in het geheugen staat."""
+
+    def __init__(self, pad: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise SystemExit("Voor Parquet-uitvoer is pyarrow nodig (pip install pyarrow)") from e
+        self._pa = pa
+        self._schema = pa.schema([
+            (f.name, pa.string() if "str" in str(f.type) else pa.float64())
+            for f in fields(kosten.KostenResultaat)
+        ])
+        self._writer = pq.ParquetWriter(pad, self._schema)
+
+    def schrijf(self, rijen: List[Dict[str, Any]]) -> None:
+        if not rijen:
+            return
+        # RDW-velden kunnen getallen bevatten; het schema houdt ze als tekst
+        tekstvelden = [veld.name for veld in self._schema if veld.type == self._pa.string()]
+        for rij in rijen:
+            for veld in tekstvelden:
+                if rij[veld] is not None:
+                    rij[veld] = str(rij[veld])
+        self._writer.write_table(self._pa.Table.from_pylist(rijen, schema=self._schema))
+
+    def sluit(self) -> None:
+        self._writer.close()
+
+
+def laad_data(pad: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Geef (overrides, stamdata) uit de opgeslagen data.
+
+    Een ``.json``-bestand wordt alleen gelezen (niet gemigreerd); de caches
+    erin gaan mee in het geheugen. Een store wordt aan de caches gekoppeld,
+    zodat een batchrun de cache van de app gebruikt en bijwerkt.
+    """
+    if not os.path.exists(pad):
+        logger.warning("%s bestaat niet; standaardwaarden worden gebruikt", pad)
+        return {}, {}
+    if pad.endswith(".json"):
+        with open(pad, "r") as f:
+            data = json.load(f)
+        # Oude tijdelijke fouten niet overnemen: met een vers tijdstip zouden ze de hele run blijven gelden
+        for namespace, doel in (("rdw_cache", cache.rdw_cache), ("wegenbelasting_cache", cache.wegenbelasting_cache)):
+            doel.update({k: v for k, v in data.get(namespace, {}).items() if not cache.is_fout(v)})
+        return data.get("overrides", {}), data.get("stamdata", {})
+    store = storage.get_store(pad)
+    cache.attach_store(store)
+    return store.get_all("overrides"), store.get_all("stamdata")
+
+
+def kentekens_uit_overrides(overrides: Dict[str, Any]) -> List[str]:
+    """Alle kentekens waarvoor een override bestaat, in volgorde van eerste voorkomen."""
+    return list(dict.fromkeys(sleutel.split("_", 1)[1] for sleutel in overrides if "_" in sleutel))
+
+
+def invoer_chunks(args, overrides: Dict[str, Any]) -> Iterator[List[str]]:
+    """Lever de kentekens in chunks; overrides uit een wagenparkbestand gaan in ``overrides``."""
+    if args.bestand:
+        with open(args.bestand, "rb") as f:
+            for chunk in vloot_import.lees_chunks(f, args.bestand, args.chunk_size):
+                kentekens, chunk_overrides = vloot_import.verwerk_chunk(chunk)
+                overrides.update(chunk_overrides)
+                yield kentekens
+        return
+    kentekens = [k.strip().upper() for k in args.kentekens if k.strip()] or kentekens_uit_overrides(overrides)
+    for start in range(0, len(kentekens), args.chunk_size):
+        yield kentekens[start:start + args.chunk_size]
+
+
+def maak_schrijver(args):
+    formaat = args.formaat
+    if formaat is None:
+        extensie = os.path.splitext(args.uitvoer or "")[1].lstrip(".").lower()
+        formaat = extensie if extensie in FORMATEN else "csv"
+    if formaat == "parquet":
+        if not args.uitvoer:
+            raise SystemExit("Parquet-uitvoer vraagt een bestand (-o)")
+        return ParquetSchrijver(args.uitvoer), None
+    uitvoer = open(args.uitvoer, "w", newline="", encoding="utf-8") if args.uitvoer else sys.stdout
+    schrijver = CsvSchrijver(uitvoer) if formaat == "csv" else JsonlSchrijver(uitvoer)
+    return schrijver, (uitvoer if args.uitvoer else None)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("kentekens", nargs="*", help="kentekens; zonder kentekens of --bestand: alle kentekens met overrides")
+    parser.add_argument("--bestand", help="wagenparkbestand (CSV of Excel) met kentekens en optionele overrides")
+    parser.add_argument("--data", default="data.db", help="opgeslagen data: data.db (standaard) of een oud data.json")
+    parser.add_argument("-o", "--uitvoer", help="uitvoerbestand; standaard stdout (CSV)")
+    parser.add_argument("--formaat", choices=FORMATEN, help="standaard afgeleid van de extensie van --uitvoer")
+    parser.add_argument("--chunk-size", type=int, default=vloot_import.CHUNK_SIZE)
+    for sleutel in pipeline.DEFAULT_STAMDATA:
+        parser.add_argument(f"--{sleutel.replace('_', '-')}", dest=sleutel, type=float, help="overschrijft de stamdata")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s", stream=sys.stderr)
+    args = parse_args(argv)
+
+    overrides, stamdata = laad_data(args.data)
+    stamdata = dict(stamdata)
+    for sleutel in pipeline.DEFAULT_STAMDATA:
+        if getattr(args, sleutel) is not None:
+            stamdata[sleutel] = getattr(args, sleutel)
+    stamdata_key = pipeline.stamdata_key(stamdata)
+
+    schrijver, uitvoer = maak_schrijver(args)
+    aantal = aantal_fouten = 0
+    try:
+        for kentekens in invoer_chunks(args, overrides):
+            results, fouten = pipeline.bereken_kentekens(kentekens, overrides, stamdata_key)
+            schrijver.schrijf([asdict(r) for r in results])
+            for fout in fouten:
+                logger.warning(fout)
+            aantal += len(results)
+            aantal_fouten += len(fouten)
+    except vloot_import.VlootImportFout as e:
+        logger.error("%s", e)
+        return 1
+    finally:
+        schrijver.sluit()
+        if uitvoer is not None:
+            uitvoer.close()
+    logger.info("%d auto's berekend, %d fouten", aantal, aantal_fouten)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
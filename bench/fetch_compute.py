@@ -0,0 +1,109 @@
+"""Meet de ophaal- en rekenstap voor 10, 100 en 1000 kentekens tegen een lokale stand-in.
+
+Start bench/standin_server.py in hetzelfde proces, laat de URL's in lookups.py
+daarnaar wijzen en draait `pipeline.bereken_kentekens` met koude caches. Per
+aantal kentekens: totale tijd, doorvoer, p50/p99 van de tijd tot een kenteken
+opgehaald is, de rekentijd daarna en het geheugenpiek (tracemalloc, in een
+aparte run zodat de tijden er geen last van hebben).
+
+Gebruik (vanuit de root van de repo):
+
+    python bench/fetch_compute.py [--aantallen 10 100 1000] [--latentie 20] [--foutkans 0]
+        [--mrb-bron offline|scraper]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import cache  # noqa: E402
+import http_client  # noqa: E402
+import lookups  # noqa: E402
+import mrb  # noqa: E402
+import pipeline  # noqa: E402
+import rdw_mirror  # noqa: E402
+from standin_server import StandinServer, kentekens  # noqa: E402
+
+
+def koude_start() -> None:
+    """Lege caches en circuit breakers, zodat elke run alles ophaalt."""
+    cache.rdw_cache.clear()
+    cache.wegenbelasting_cache.clear()
+    cache.provincie_cache.clear()
+    with http_client._breakers_lock:
+        http_client._breakers.clear()
+
+
+def percentiel(waarden, p: float) -> float:
+    if not waarden:
+        return float("nan")
+    waarden = sorted(waarden)
+    return waarden[min(len(waarden) - 1, int(round(p / 100 * (len(waarden) - 1))))]
+
+
+def run(aantal: int, stamdata) -> dict:
+    koude_start()
+    platen = kentekens(aantal)
+    klaar = []
+    start = time.perf_counter()
+    results, fouten = pipeline.bereken_kentekens(
+        platen, {}, stamdata, on_done=lambda *_: klaar.append(time.perf_counter() - start)
+    )
+    totaal = time.perf_counter() - start
+    return {
+        "totaal": totaal,
+        "per_kenteken": klaar,
+        "rekenen": totaal - (max(klaar) if klaar else 0.0),
+        "resultaten": len(results),
+        "fouten": len(fouten),
+    }
+
+
+def piekgeheugen(aantal: int, stamdata) -> float:
+    """Piek van de Python-allocaties tijdens een run, in MiB."""
+    koude_start()
+    tracemalloc.start()
+    try:
+        pipeline.bereken_kentekens(kentekens(aantal), {}, stamdata)
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--aantallen", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--latentie", type=float, default=20.0, help="vertraging per verzoek in ms")
+    parser.add_argument("--foutkans", type=float, default=0.0, help="kans op een 503 per verzoek")
+    parser.add_argument("--mrb-bron", choices=("offline", "controle", "scraper"), default=mrb.MRB_BRON)
+    args = parser.parse_args()
+
+    server = StandinServer(latentie=args.latentie / 1000, foutkans=args.foutkans).start()
+    lookups.RDW_BASIS_URL = f"{server.basis_url}/resource/m9d7-ebf2.json"
+    lookups.RDW_BRANDSTOF_URL = f"{server.basis_url}/resource/8ys7-d773.json"
+    lookups.WEGENBELASTING_URL = f"{server.basis_url}/kenteken-check/"
+    mrb.MRB_BRON = args.mrb_bron
+    # Altijd via de (stand-in) API, ook als er lokaal een RDW-index staat
+    rdw_mirror.get_mirror = lambda *args, **kwargs: None
+    stamdata = pipeline.stamdata_key({})
+
+    print(f"latentie {args.latentie:g} ms, foutkans {args.foutkans:g}, MRB-bron {args.mrb_bron}")
+    print(f"{'kentekens':>9} {'totaal':>9} {'doorvoer':>12} {'p50':>9} {'p99':>9} {'rekenen':>9} {'piek':>9} {'verzoeken':>9} {'fouten':>6}")
+    for aantal in args.aantallen:
+        verzoeken = server.verzoeken
+        meting = run(aantal, stamdata)
+        verzoeken = server.verzoeken - verzoeken
+        piek = piekgeheugen(aantal, stamdata)
+        print(
+            f"{aantal:>9} {meting['totaal']:>7.2f} s {aantal / meting['totaal']:>8.0f} /s "
+            f"{percentiel(meting['per_kenteken'], 50) * 1000:>6.0f} ms {percentiel(meting['per_kenteken'], 99) * 1000:>6.0f} ms "
+            f"{meting['rekenen'] * 1000:>6.0f} ms {piek:>5.1f} MiB {verzoeken:>9} {meting['fouten']:>6}"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
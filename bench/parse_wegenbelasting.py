@@ -0,0 +1,69 @@
+"""Meet de parsetijd van wegenbelasting.net-resultaatpagina's.
+
+Vergelijkt de oude aanpak (BeautifulSoup met html.parser over de hele pagina)
+met `lookups.parse_wegenbelasting_pagina` op de opgeslagen pagina's in
+bench/fixtures, en controleert dat beide hetzelfde Overijssel-bedrag vinden.
+
+Gebruik (vanuit de root van de repo):
+
+    python bench/parse_wegenbelasting.py [--herhalingen 200]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lookups import parse_wegenbelasting_pagina, prijs_voor_provincie  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def parse_html_parser(html: str) -> str:
+    """De oorspronkelijke parser uit get_overijssel_price, ter vergelijking."""
+    soup = BeautifulSoup(html, 'html.parser')
+    table = soup.find("table", class_="wb-resultaat")
+    if table:
+        for row in table.find_all("tr"):
+            if "Overijssel" in row.text:
+                cells = row.find_all("td")
+                if len(cells) >= 2:
+                    return cells[1].text.strip()
+    return "Niet gevonden"
+
+
+def parse_lxml(html: str) -> str:
+    return prijs_voor_provincie(parse_wegenbelasting_pagina(html), "Overijssel")
+
+
+def meet(functie, html: str, herhalingen: int) -> float:
+    """Gemiddelde tijd per aanroep in milliseconden."""
+    start = time.perf_counter()
+    for _ in range(herhalingen):
+        functie(html)
+    return (time.perf_counter() - start) / herhalingen * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--herhalingen", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'pagina':<40} {'html.parser':>12} {'lxml':>10} {'factor':>8}")
+    for pad in sorted(glob.glob(os.path.join(FIXTURES, "wegenbelasting_*.html"))):
+        with open(pad, encoding="utf-8") as f:
+            html = f.read()
+        oud, nieuw = parse_html_parser(html), parse_lxml(html)
+        if oud != nieuw:
+            raise SystemExit(f"{os.path.basename(pad)}: {oud!r} != {nieuw!r}")
+        tijd_oud = meet(parse_html_parser, html, args.herhalingen)
+        tijd_nieuw = meet(parse_lxml, html, args.herhalingen)
+        print(f"{os.path.basename(pad):<40} {tijd_oud:>9.3f} ms {tijd_nieuw:>7.3f} ms {tijd_oud / tijd_nieuw:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
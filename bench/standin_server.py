@@ -0,0 +1,160 @@
+"""Lokale stand-in voor de RDW-API en wegenbelasting.net, voor benchmarks.
+
+Bedient de twee Socrata-datasets (per kenteken en met ``$where=kenteken in
+(...)``) en het kenteken-checkformulier van wegenbelasting.net met synthetische
+data. Elk kenteken van de vorm ``BM0001`` bestaat; de brandstof wisselt per
+nummer tussen benzine, diesel en elektrisch. De resultaatpagina's komen uit
+bench/fixtures. Vertraging en foutkans zijn instelbaar; een fout is een 503.
+
+Los starten (vanuit de root van de repo):
+
+    python bench/standin_server.py [--poort 8765] [--latentie 50] [--foutkans 0.01]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BRANDSTOFFEN = ("benzine", "diesel", "elektrisch")
+_KENTEKEN = re.compile(r"^BM(\d{4})$")
+
+
+def _pagina(naam: str) -> bytes:
+    with open(os.path.join(FIXTURES, f"wegenbelasting_{naam}.html"), "rb") as f:
+        return f.read()
+
+
+PAGINAS = {naam: _pagina(naam) for naam in BRANDSTOFFEN + ("geen_resultaat",)}
+
+
+def kentekens(aantal: int) -> List[str]:
+    """De eerste ``aantal`` kentekens die de stand-in kent."""
+    return [f"BM{i:04d}" for i in range(1, aantal + 1)]
+
+
+def _soort(kenteken: str) -> Optional[str]:
+    match = _KENTEKEN.match(kenteken)
+    return BRANDSTOFFEN[int(match.group(1)) % 3] if match else None
+
+
+def basis_record(kenteken: str) -> Optional[Dict[str, str]]:
+    soort = _soort(kenteken)
+    if soort is None:
+        return None
+    nummer = int(kenteken[2:])
+    return {
+        "kenteken": kenteken,
+        "voertuigsoort": "Personenauto",
+        "merk": ("VOLKSWAGEN", "PEUGEOT", "TESLA")[BRANDSTOFFEN.index(soort)],
+        "handelsbenaming": ("GOLF", "308", "MODEL 3")[BRANDSTOFFEN.index(soort)],
+        "catalogusprijs": str(25000 + nummer * 10),
+        "massa_ledig_voertuig": str(1100 + nummer % 700),
+        "massa_rijklaar": str(1200 + nummer % 700),
+        "eerste_kleur": "GRIJS",
+        "datum_eerste_toelating": f"{2015 + nummer % 10}0315",
+        "vervaldatum_apk": "20260601",
+    }
+
+
+def brandstof_record(kenteken: str) -> Optional[Dict[str, str]]:
+    soort = _soort(kenteken)
+    if soort is None:
+        return None
+    record = {"kenteken": kenteken, "brandstof_volgnummer": "1"}
+    if soort == "elektrisch":
+        record.update(brandstof_omschrijving="Elektriciteit", elektrisch_verbruik_enkel_elektrisch_wltp="160")
+    else:
+        record.update(
+            brandstof_omschrijving="Benzine" if soort == "benzine" else "Diesel",
+            brandstof_verbruik_gecombineerd_wltp="5.8",
+            co2_uitstoot_gecombineerd="132",
+            uitstoot_deeltjes_licht="0.001",
+        )
+    return record
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _antwoord(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _storing(self) -> bool:
+        server = self.server
+        time.sleep(server.latentie)
+        with server.lock:
+            server.verzoeken += 1
+        if server.random.random() < server.foutkans:
+            self._antwoord(503, b"Service Unavailable", "text/plain")
+            return True
+        return False
+
+    def do_GET(self):
+        if self._storing():
+            return
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if "kenteken" in query:
+            gevraagd = query["kenteken"]
+        else:
+            gevraagd = re.findall(r"'([^']*)'", query.get("$where", [""])[0])
+        maak = basis_record if url.path.endswith("m9d7-ebf2.json") else brandstof_record
+        records = [r for r in map(maak, gevraagd) if r is not None]
+        self._antwoord(200, json.dumps(records).encode(), "application/json")
+
+    def do_POST(self):
+        lengte = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(lengte).decode())
+        if self._storing():
+            return
+        soort = _soort(form.get("k", [""])[0])
+        self._antwoord(200, PAGINAS[soort or "geen_resultaat"], "text/html; charset=utf-8")
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, poort: int = 0, latentie: float = 0.0, foutkans: float = 0.0, seed: int = 1):
+        super().__init__(("127.0.0.1", poort), _Handler)
+        self.latentie = latentie
+        self.foutkans = foutkans
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.verzoeken = 0
+
+    @property
+    def basis_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "StandinServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--poort", type=int, default=8765)
+    parser.add_argument("--latentie", type=float, default=0.0, help="vertraging per verzoek in ms")
+    parser.add_argument("--foutkans", type=float, default=0.0, help="kans op een 503 per verzoek")
+    args = parser.parse_args()
+    server = StandinServer(args.poort, args.latentie / 1000, args.foutkans)
+    print(f"Stand-in op {server.basis_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
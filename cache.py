@@ -0,0 +1,263 @@
+"""Proces-brede, thread-safe caches voor RDW- en wegenbelastingdata.
+
+Streamlit voert elke sessie uit in een eigen thread maar in hetzelfde proces.
+Door de caches op moduleniveau te houden delen alle sessies dezelfde data, in
+plaats van dat elke sessie (en elke login) alles opnieuw ophaalt. Met een
+gekoppelde store (zie storage.py) worden items bij een misser lazy geladen en
+wordt elke wijziging direct weggeschreven.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+RDW_CACHE_MAXSIZE = 10000
+# TTL per veldklasse: de vaste velden van een RDW-record (catalogusprijs,
+# massa, brandstof) veranderen niet en blijven lang geldig; de vluchtige
+# (`lookups.VLUCHTIGE_VELDEN`, zoals de APK-vervaldatum) worden na
+# `RDW_REVALIDATIE` opnieuw gecontroleerd, zonder de rest op te halen.
+RDW_CACHE_TTL = 365 * 24 * 3600
+RDW_REVALIDATIE = 24 * 3600
+WEGENBELASTING_CACHE_MAXSIZE = 10000
+# De tarieven veranderen per kwartaal of jaar; na een week opnieuw scrapen,
+# waarbij het oude bedrag blijft staan als dat mislukt.
+WEGENBELASTING_CACHE_TTL = 30 * 24 * 3600
+WEGENBELASTING_REVALIDATIE = 7 * 24 * 3600
+HTTP_VALIDATIE_MAXSIZE = 1000
+# Negatieve items: een fout (netwerk, time-out, open circuit) is tijdelijk en
+# blijft kort staan; "niet gevonden" verandert zelden en mag langer blijven.
+FOUT_TTL = 60
+NIET_GEVONDEN_TTL = 24 * 3600
+
+_MISSING = object()
+
+
+def is_fout(value: Any) -> bool:
+    """Tijdelijke fout zoals de fetchers die teruggeven: ``{"error": "Error: ..."}`` of ``"Error: ..."``."""
+    if isinstance(value, dict):
+        value = value.get("error")
+    return isinstance(value, str) and value.startswith("Error")
+
+
+def is_niet_gevonden(value: Any) -> bool:
+    """Definitief negatief antwoord: onbekend kenteken bij de RDW of op wegenbelasting.net."""
+    if isinstance(value, dict):
+        return value.get("error") == "Geen data gevonden"
+    return value == "Niet gevonden"
+
+
+class LookupCache:
+    """
+    Dict-achtige cache met een maximale grootte, LRU-verwijdering en TTL per item.
+
+    Fouten en "niet gevonden" krijgen een kortere TTL (`FOUT_TTL`,
+    `NIET_GEVONDEN_TTL`); fouten worden bovendien niet naar de store geschreven.
+    Met ``revalidate_after`` geeft `stale` de items die nog geldig zijn maar
+    opnieuw gecontroleerd moeten worden.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: Optional[float] = None,
+        namespace: Optional[str] = None,
+        revalidate_after: Optional[float] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.revalidate_after = revalidate_after
+        self.namespace = namespace
+        self.store = None
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Loopt op bij elke schrijfactie, zodat afgeleide resultaten kunnen zien dat er iets veranderde
+        self.revision = 0
+        # Opzoekingen via `get` (ook `in` en `[]`), voor metrics.py
+        self.hits = 0
+        self.misses = 0
+
+    def ttl_for(self, value: Any) -> Optional[float]:
+        if is_fout(value):
+            return FOUT_TTL
+        if is_niet_gevonden(value):
+            return NIET_GEVONDEN_TTL if self.ttl is None else min(self.ttl, NIET_GEVONDEN_TTL)
+        return self.ttl
+
+    def _is_expired(self, stored_at: float, value: Any, now: float) -> bool:
+        ttl = self.ttl_for(value)
+        return ttl is not None and now - stored_at > ttl
+
+    def _lookup(self, key: str) -> Any:
+        # Aanroeper houdt de lock vast
+        item = self._data.get(key)
+        if item is None:
+            return _MISSING
+        stored_at, value = item
+        if self._is_expired(stored_at, value, time.time()):
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def _store(self, key: str, value: Any, stored_at: float) -> None:
+        # Aanroeper houdt de lock vast
+        self._data[key] = (stored_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def _load_from_store(self, key: str) -> Any:
+        if self.store is None:
+            return _MISSING
+        item = self.store.get(self.namespace, key)
+        if item is None:
+            return _MISSING
+        value, stored_at = item
+        if self._is_expired(stored_at, value, time.time()):
+            return _MISSING
+        with self._lock:
+            if key not in self._data:
+                self._store(key, value, stored_at)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            value = self._lookup(key)
+        if value is _MISSING:
+            value = self._load_from_store(key)
+        with self._lock:
+            if value is _MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return default if value is _MISSING else value
+
+    def peek(self, key: str, default: Any = None) -> Any:
+        """
+        Waarde uit het geheugen, voor boekhouding zoals cache-sleutels: telt
+        niet mee als hit of miss, laat de LRU-volgorde staan en leest niet uit
+        de store.
+        """
+        with self._lock:
+            item = self._data.get(key)
+        if item is None or self._is_expired(item[0], item[1], time.time()):
+            return default
+        return item[1]
+
+    def version(self, key: str) -> Optional[float]:
+        """Tijdstip waarop het item is opgeslagen; verandert bij elke nieuwe waarde."""
+        with self._lock:
+            item = self._data.get(key)
+        return None if item is None else item[0]
+
+    def stale(self, keys: Iterable[str]) -> List[str]:
+        """
+        Sleutels uit ``keys`` met een geldige waarde die ouder is dan
+        ``revalidate_after``. Fouten en "niet gevonden" verlopen zelf al snel
+        en tellen niet mee; de hit/miss-tellers blijven ongemoeid.
+        """
+        if self.revalidate_after is None:
+            return []
+        grens = time.time() - self.revalidate_after
+        verouderd = []
+        for key in keys:
+            with self._lock:
+                value = self._lookup(key)
+            if value is _MISSING:
+                value = self._load_from_store(key)
+            if value is _MISSING or is_fout(value) or is_niet_gevonden(value):
+                continue
+            stored_at = self.version(key)
+            if stored_at is not None and stored_at < grens:
+                verouderd.append(key)
+        return verouderd
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.update({key: value})
+
+    def __contains__(self, key: str) -> bool:
+        # Net als `__len__` en `__iter__` alleen het geheugen, zonder de tellers
+        return self.peek(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.to_dict())
+
+    def update(self, entries: Dict[str, Any], refresh: bool = False, stored_at: Optional[float] = None) -> None:
+        """
+        Zet items in de cache. Met ``refresh`` gaan ook ongewijzigde waarden
+        naar de store, zodat hun tijdstip daar bijgewerkt wordt (zie warmup.py).
+        ``stored_at`` geeft de items een ouder tijdstip dan nu, voor data die
+        al eerder is opgehaald (zoals de lokale RDW-index).
+        """
+        now = time.time()
+        stored_at = now if stored_at is None else stored_at
+        changed = {}
+        with self._lock:
+            for key, value in entries.items():
+                item = self._data.get(key)
+                if not is_fout(value) and (
+                    refresh or item is None or item[1] != value or self._is_expired(item[0], item[1], now)
+                ):
+                    changed[key] = value
+                self._store(key, value, stored_at)
+            if entries:
+                self.revision += 1
+        # Alleen echt gewijzigde items naar de store; ongewijzigde herhalingen kosten geen I/O.
+        # Tijdelijke fouten blijven alleen in het geheugen, zodat een storing
+        # na een herstart niet terugkomt.
+        if self.store is not None and changed:
+            self.store.set_many(self.namespace, changed, updated_at=stored_at)
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+            self.revision += 1
+        if self.store is not None:
+            self.store.set_many(self.namespace, {}, removed=[key])
+        return default if item is None else item[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.revision += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Momentopname van alle niet-verlopen items in het geheugen."""
+        now = time.time()
+        with self._lock:
+            return {
+                key: value
+                for key, (stored_at, value) in self._data.items()
+                if not self._is_expired(stored_at, value, now)
+            }
+
+
+rdw_cache = LookupCache(RDW_CACHE_MAXSIZE, RDW_CACHE_TTL, namespace="rdw_cache", revalidate_after=RDW_REVALIDATIE)
+wegenbelasting_cache = LookupCache(
+    WEGENBELASTING_CACHE_MAXSIZE,
+    WEGENBELASTING_CACHE_TTL,
+    namespace="wegenbelasting_cache",
+    revalidate_after=WEGENBELASTING_REVALIDATIE,
+)
+# Bedragen van alle provincies per kenteken, zodat een andere provincie geen nieuwe scrape vraagt
+provincie_cache = LookupCache(WEGENBELASTING_CACHE_MAXSIZE, WEGENBELASTING_CACHE_TTL, namespace="wegenbelasting_provincies")
+# ETag en Last-Modified per RDW-query, voor voorwaardelijke verzoeken (zie `lookups.revalideer_rdw`)
+http_validatie_cache = LookupCache(HTTP_VALIDATIE_MAXSIZE, RDW_CACHE_TTL, namespace="http_validatie")
+
+
+def attach_store(store) -> None:
+    """Koppel de gedeelde caches aan een persistente store (zie storage.py)."""
+    rdw_cache.store = store
+    wegenbelasting_cache.store = store
+    provincie_cache.store = store
+    http_validatie_cache.store = store
@@ -0,0 +1,175 @@
+"""Gedeelde ophaalmotor op één asyncio-eventloop in een achtergrondthread.
+
+Elke Streamlit-sessie draait in een eigen thread. Zonder deze motor start elke
+sessie voor het ophalen een eigen threadpool, en vragen twee sessies die
+hetzelfde kenteken zoeken het allebei op. Hier komen alle opvragingen uit alle
+sessies op één eventloop samen:
+
+- RDW-opvragingen die binnen `BATCH_WACHTTIJD` binnenkomen gaan samen in één
+  bulkquery (`lookups.fetch_rdw_bulk`), ook als ze uit verschillende sessies
+  komen;
+- een kenteken dat al onderweg is wordt niet nog eens opgevraagd; de tweede
+  aanvrager wacht op hetzelfde resultaat;
+- het eigenlijke netwerkwerk loopt via de gedeelde sessie van http_client in
+  een vaste pool van `MAX_IO_THREADS` threads, dus het aantal verbindingen
+  hangt niet af van het aantal sessies.
+
+Vanuit gewone threads geven `LookupEngine.rdw` en `LookupEngine.wegenbelasting`
+een ``concurrent.futures.Future``; coroutines op de loop van de motor kunnen
+`rdw_async` en `wegenbelasting_async` awaiten, en andere eventloops kunnen de
+futures met ``asyncio.wrap_future`` awaiten. De resultaten komen ook in de
+gedeelde caches (cache.py).
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import cache
+import http_client
+from lookups import RDW_CHUNK_SIZE, fetch_rdw_bulk, fetch_wegenbelasting, normalize_kenteken
+
+logger = logging.getLogger(__name__)
+
+# Seconden dat een RDW-opvraging wacht op andere om samen in één query te gaan
+BATCH_WACHTTIJD = 0.02
+# Threads voor het netwerkwerk: genoeg voor de per-host limiet van RDW en wegenbelasting.net samen
+MAX_IO_THREADS = 2 * http_client.MAX_PER_HOST
+
+
+class LookupEngine:
+    """Eventloop met samenvoegen en ontdubbelen van opvragingen; zie de moduledocstring."""
+
+    def __init__(self, batch_wachttijd: float = BATCH_WACHTTIJD, chunk_size: int = RDW_CHUNK_SIZE):
+        self.batch_wachttijd = batch_wachttijd
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(MAX_IO_THREADS, thread_name_prefix="engine-io")
+        # Aparte pool voor de brandstofquery naast de basisquery van dezelfde chunk,
+        # zodat een chunk nooit wacht op een plek in zijn eigen pool
+        self._dataset_executor = ThreadPoolExecutor(MAX_IO_THREADS, thread_name_prefix="engine-dataset")
+        # Eén thread voor werk waar geen sessie op wacht, zoals het revalideren
+        self._achtergrond_executor = ThreadPoolExecutor(1, thread_name_prefix="engine-achtergrond")
+        self._loop = asyncio.new_event_loop()
+        # Alleen aangeraakt vanuit de loop, dus zonder lock
+        self._rdw_onderweg: Dict[str, asyncio.Future] = {}
+        self._wegenbelasting_onderweg: Dict[str, asyncio.Future] = {}
+        self._rdw_wachtrij: List[str] = []
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._stats = {"opvragingen": 0, "ontdubbeld": 0, "rdw_queries": 0, "scrapes": 0}
+        gestart = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(gestart,), name="engine", daemon=True)
+        self._thread.start()
+        gestart.wait()
+
+    def _run(self, gestart: threading.Event) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(gestart.set)
+        self._loop.run_forever()
+
+    def submit(self, coro) -> Future:
+        """Voer een coroutine uit op de loop van de motor; veilig vanuit elke thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def achtergrond(self, fn, *args) -> Future:
+        """Voer ``fn(*args)`` uit in de achtergrondthread, na eerder ingepland werk; fouten worden gelogd."""
+        future = self._achtergrond_executor.submit(fn, *args)
+        future.add_done_callback(_log_fout)
+        return future
+
+    def rdw(self, kenteken: str) -> Future:
+        """Future met het RDW-record van ``kenteken``, zoals `lookups.fetch_rdw_bulk` het per kenteken geeft."""
+        return self.submit(self.rdw_async(kenteken))
+
+    def wegenbelasting(self, kenteken: str) -> Future:
+        """Future met de bedragen per provincie, zoals `lookups.fetch_wegenbelasting` ze geeft."""
+        return self.submit(self.wegenbelasting_async(kenteken))
+
+    def status(self) -> Dict[str, int]:
+        """Opvragingen, waarvan ontdubbeld, en het aantal RDW-queries en scrapes sinds de start."""
+        return dict(self._stats)
+
+    async def rdw_async(self, kenteken: str) -> Dict[str, Any]:
+        kenteken = normalize_kenteken(kenteken)
+        self._stats["opvragingen"] += 1
+        onderweg = self._rdw_onderweg.get(kenteken)
+        if onderweg is not None:
+            self._stats["ontdubbeld"] += 1
+        else:
+            onderweg = self._rdw_onderweg[kenteken] = self._loop.create_future()
+            self._rdw_wachtrij.append(kenteken)
+            if len(self._rdw_wachtrij) >= self.chunk_size:
+                self._flush_rdw()
+            elif self._flush_timer is None:
+                self._flush_timer = self._loop.call_later(self.batch_wachttijd, self._flush_rdw)
+        # Afschermen, zodat een afgebroken aanvrager de andere wachtenden niet raakt
+        return await asyncio.shield(onderweg)
+
+    def _flush_rdw(self) -> None:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        chunk, self._rdw_wachtrij = self._rdw_wachtrij, []
+        if chunk:
+            self._loop.create_task(self._haal_rdw(chunk))
+
+    async def _haal_rdw(self, chunk: List[str]) -> None:
+        self._stats["rdw_queries"] += 1
+        try:
+            opgehaald = await self._loop.run_in_executor(self._executor, self._rdw_ophalen, chunk)
+        except Exception as e:
+            opgehaald = {kenteken: {"error": f"Error: {e}"} for kenteken in chunk}
+        for kenteken in chunk:
+            onderweg = self._rdw_onderweg.pop(kenteken)
+            if not onderweg.done():
+                onderweg.set_result(opgehaald[kenteken])
+
+    def _rdw_ophalen(self, chunk: List[str]) -> Dict[str, Dict[str, Any]]:
+        # In een IO-thread: de cache opnieuw bekijken (een andere sessie kan het
+        # net opgehaald hebben) en de rest in één bulkquery ophalen
+        gevonden = {kenteken: cache.rdw_cache.get(kenteken) for kenteken in chunk}
+        missers = [kenteken for kenteken, data in gevonden.items() if data is None]
+        if missers:
+            opgehaald = fetch_rdw_bulk(missers, self._dataset_executor, chunk_size=self.chunk_size)
+            cache.rdw_cache.update(opgehaald)
+            gevonden.update(opgehaald)
+        return gevonden
+
+    async def wegenbelasting_async(self, kenteken: str) -> Dict[str, str]:
+        self._stats["opvragingen"] += 1
+        onderweg = self._wegenbelasting_onderweg.get(kenteken)
+        if onderweg is not None:
+            self._stats["ontdubbeld"] += 1
+            return await asyncio.shield(onderweg)
+        self._stats["scrapes"] += 1
+        onderweg = self._wegenbelasting_onderweg[kenteken] = asyncio.ensure_future(
+            self._loop.run_in_executor(self._executor, _wegenbelasting_ophalen, kenteken)
+        )
+        onderweg.add_done_callback(lambda _: self._wegenbelasting_onderweg.pop(kenteken, None))
+        return await asyncio.shield(onderweg)
+
+
+def _log_fout(future: Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Achtergrondwerk van de motor mislukt", exc_info=future.exception())
+
+
+def _wegenbelasting_ophalen(kenteken: str) -> Dict[str, str]:
+    provincies = fetch_wegenbelasting(kenteken)
+    if "error" not in provincies:
+        cache.provincie_cache[kenteken] = provincies
+    return provincies
+
+
+_engine: Optional[LookupEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> LookupEngine:
+    """De proces-brede motor; wordt bij het eerste gebruik gestart."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = LookupEngine()
+    return _engine
@@ -0,0 +1,257 @@
+"""Gedeelde HTTP-transportlaag voor alle uitgaande verzoeken.
+
+Eén ``requests.Session`` per proces met keep-alive connection pools per host,
+standaard connect/read-timeouts, retries met exponentiële backoff op 429/5xx
+en een maximum aantal gelijktijdige verzoeken per host.
+
+Per host houdt een circuit breaker bij of de dienst bereikbaar is. Na
+`BREAKER_DREMPEL` mislukte verzoeken op rij faalt elk verzoek direct met
+`CircuitOpenError`; na `BREAKER_WACHTTIJD` seconden mag één proefverzoek door
+dat bepaalt of het circuit weer sluit.
+
+Verzoeken naar hosts in `RATE_LIMITS` gaan door een proces-brede token bucket,
+zodat alle sessies samen onder het quotum blijven. Voor de RDW (Socrata) wordt
+een app-token uit ``AUTOPONTI_RDW_APP_TOKEN`` meegestuurd als ``X-App-Token``.
+Hoe vaak er op de limiter gewacht is en hoe vaak een host 429 gaf, staat in
+`throttle_stats`.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 20
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Maximaal aantal gelijktijdige verzoeken (en open verbindingen) per host
+MAX_PER_HOST = 8
+# Aantal mislukte verzoeken op rij waarna een host als onbereikbaar geldt
+BREAKER_DREMPEL = 5
+# Seconden tot het volgende proefverzoek naar een onbereikbare host
+BREAKER_WACHTTIJD = 30.0
+
+
+def _parse_rate_limits(waarde: str) -> Dict[str, Tuple[float, float]]:
+    """Lees ``"host=verzoeken_per_seconde[/burst],..."``, bijv. ``"opendata.rdw.nl=20/40"``."""
+    limieten = {}
+    for deel in filter(None, (d.strip() for d in waarde.split(","))):
+        host, _, limiet = deel.partition("=")
+        per_seconde, _, burst = limiet.partition("/")
+        limieten[host.strip()] = (float(per_seconde), float(burst or per_seconde))
+    return limieten
+
+
+# Verzoeken per seconde en burst per host; hosts zonder limiet worden niet afgeremd
+RATE_LIMITS: Dict[str, Tuple[float, float]] = {
+    "opendata.rdw.nl": (5.0, 10.0),
+    **_parse_rate_limits(os.environ.get("AUTOPONTI_RATE_LIMITS", "")),
+}
+# App-tokens per host; met een token geeft Socrata een hoger quotum
+APP_TOKENS: Dict[str, str] = {
+    host: token
+    for host, token in {"opendata.rdw.nl": os.environ.get("AUTOPONTI_RDW_APP_TOKEN")}.items()
+    if token
+}
+
+_session = None
+_session_lock = threading.Lock()
+_host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_host_semaphores_lock = threading.Lock()
+_breakers: Dict[str, "CircuitBreaker"] = {}
+_breakers_lock = threading.Lock()
+_buckets: Dict[str, "TokenBucket"] = {}
+_buckets_lock = threading.Lock()
+_throttle_stats: Dict[str, Dict[str, float]] = {}
+_throttle_stats_lock = threading.Lock()
+
+
+def _tel(host: str, teller: str, aantal: float = 1) -> None:
+    with _throttle_stats_lock:
+        stats = _throttle_stats.setdefault(host, {"vertraagd": 0, "wachttijd": 0.0, "429": 0})
+        stats[teller] += aantal
+
+
+def throttle_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Tellers per host: ``vertraagd`` (verzoeken die op de limiter wachtten),
+    ``wachttijd`` (totaal in seconden) en ``429`` (Too Many Requests, ook als
+    een retry daarna slaagde).
+    """
+    with _throttle_stats_lock:
+        return {host: dict(stats) for host, stats in _throttle_stats.items()}
+
+
+class TokenBucket:
+    """Token bucket: gemiddeld ``per_seconde`` verzoeken, met pieken tot ``burst``."""
+
+    def __init__(self, per_seconde: float, burst: float):
+        self.per_seconde = per_seconde
+        self.burst = burst
+        self._tokens = burst
+        self._bijgewerkt = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserveer(self) -> float:
+        """Neem een token; geeft het aantal seconden dat de aanroeper nog moet wachten."""
+        with self._lock:
+            nu = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (nu - self._bijgewerkt) * self.per_seconde)
+            self._bijgewerkt = nu
+            # Het token wordt direct gereserveerd (eventueel negatief), zodat
+            # wachtende threads op volgorde aan de beurt komen.
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.per_seconde)
+
+
+def _bucket(host: str) -> Optional[TokenBucket]:
+    limiet = RATE_LIMITS.get(host)
+    if limiet is None:
+        return None
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = _buckets[host] = TokenBucket(*limiet)
+    return bucket
+
+
+class _TellendeRetry(Retry):
+    """Retry die elke 429 meetelt, ook de exemplaren die urllib3 zelf opnieuw probeert."""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if response is not None and response.status == 429 and _pool is not None:
+            _tel(_pool.host, "429")
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """De host is onlangs herhaaldelijk onbereikbaar geweest; het verzoek is niet verstuurd."""
+
+
+class CircuitBreaker:
+    """Gesloten, open of half-open circuit voor één host."""
+
+    def __init__(self, drempel: int = BREAKER_DREMPEL, wachttijd: float = BREAKER_WACHTTIJD):
+        self.drempel = drempel
+        self.wachttijd = wachttijd
+        self.fouten = 0
+        self._open_sinds: Optional[float] = None
+        self._proef_bezig = False
+        self._lock = threading.Lock()
+
+    @property
+    def open(self) -> bool:
+        return self._open_sinds is not None
+
+    def toestaan(self) -> bool:
+        """Of een verzoek door mag; bij een open circuit alleen één proefverzoek na de wachttijd."""
+        with self._lock:
+            if self._open_sinds is None:
+                return True
+            if self._proef_bezig or time.monotonic() - self._open_sinds < self.wachttijd:
+                return False
+            self._proef_bezig = True
+            return True
+
+    def gelukt(self) -> None:
+        with self._lock:
+            self.fouten = 0
+            self._open_sinds = None
+            self._proef_bezig = False
+
+    def mislukt(self) -> None:
+        with self._lock:
+            self.fouten += 1
+            if self._proef_bezig or self.fouten >= self.drempel:
+                self._open_sinds = time.monotonic()
+            self._proef_bezig = False
+
+
+def _build_session() -> requests.Session:
+    retry = _TellendeRetry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        # De kenteken-check POST is een opvraging zonder bijwerkingen
+        allowed_methods=frozenset({"GET", "POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_PER_HOST, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Geef de proces-brede sessie terug; wordt bij het eerste gebruik aangemaakt."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def _host_semaphore(url: str) -> threading.BoundedSemaphore:
+    host = urlsplit(url).netloc
+    with _host_semaphores_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = _host_semaphores[host] = threading.BoundedSemaphore(MAX_PER_HOST)
+    return semaphore
+
+
+def get_breaker(url: str) -> CircuitBreaker:
+    host = urlsplit(url).netloc
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker()
+    return breaker
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """Voer een verzoek uit via de gedeelde sessie, met timeout, rate limit, per-host limiet en circuit breaker."""
+    # Hostnaam zonder poort, zoals urllib3 hem aan `_TellendeRetry` doorgeeft
+    host = urlsplit(url).hostname
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+    if host in APP_TOKENS:
+        kwargs["headers"] = {"X-App-Token": APP_TOKENS[host], **(kwargs.get("headers") or {})}
+    breaker = get_breaker(url)
+    if not breaker.toestaan():
+        raise CircuitOpenError(f"{host} is tijdelijk onbereikbaar")
+    bucket = _bucket(host)
+    if bucket is not None:
+        wachten = bucket.reserveer()
+        if wachten > 0:
+            _tel(host, "vertraagd")
+            _tel(host, "wachttijd", wachten)
+            time.sleep(wachten)
+    try:
+        with _host_semaphore(url):
+            response = get_session().request(method, url, **kwargs)
+    except Exception:
+        breaker.mislukt()
+        raise
+    # Een 429 of 5xx na alle retries telt ook als storing; 4xx is een antwoord
+    if response.status_code in RETRY_STATUS_CODES:
+        breaker.mislukt()
+    else:
+        breaker.gelukt()
+    return response
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
@@ -0,0 +1,175 @@
+"""Kostenberekening voor een heel wagenpark in één gevectoriseerde stap.
+
+Deze module kent geen Streamlit: de invoer is een tabel met één rij per auto
+plus de algemene instellingen (stamdata), de uitvoer dezelfde tabel met alle
+berekende kolommen erbij. De formules en hun volgorde zijn gelijk aan de
+oorspronkelijke per-auto berekening, zodat de uitkomsten exact overeenkomen.
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Standaardwaarden als er geen override is
+DEFAULT_AANSCHAFWAARDE = 15000.00
+DEFAULT_AFSCHRIJVING_PERCENTAGE = 15.0
+DEFAULT_VERZEKERING_PER_MAAND = 200.0
+DEFAULT_LEASEPRIJS = 0.0
+DEFAULT_ONDERHOUD_PER_MAAND = 80.0
+
+# Kolommen die `bereken_kosten` in de invoertabel verwacht
+INPUT_COLUMNS = [
+    "aanschafwaarde",
+    "afschrijving_percentage",
+    "verzekering_per_maand",
+    "leaseprijs",
+    "onderhoud_per_maand",
+    "wegenbelasting",
+    "verbruik",
+    "is_elektrisch",
+]
+
+
+@dataclass(slots=True)
+class KostenResultaat:
+    """Berekende kosten en voertuigdetails van één auto, als getallen; opmaak gebeurt pas bij weergave."""
+    kenteken: str
+    merk: str
+    model: str
+    catalogusprijs: Optional[float]
+    aanschafwaarde: float
+    afschrijving_percentage: float
+    afschrijving_per_maand: float
+    wegenbelasting: float
+    onderhoud_per_maand: float
+    verbruik: float
+    verbruik_eenheid: str
+    brandstof_per_maand: float
+    rente_per_maand: float
+    verzekering_per_maand: float
+    kosten_excl_brandstof: float
+    kosten_incl_brandstof: float
+    leaseprijs: float
+    leaseprijs_incl: float
+    verschil: float
+    bouwjaar: Optional[str]
+    gewicht: Optional[str]
+    kleur: Optional[str]
+    apk: Optional[str]
+    co2: Optional[str]
+    fijnstof: Optional[str]
+
+
+def parse_wegenbelasting(wb_str: str) -> float:
+    """Zet een bedrag van wegenbelasting.net (bijv. "€ 66,00") om naar een getal; 0.0 als dat niet lukt."""
+    try:
+        if wb_str.startswith("€"):
+            return float(wb_str.split(" ")[1].replace(",", "."))
+        return float(wb_str.replace(",", "."))
+    except Exception:
+        return 0.0
+
+
+def is_elektrisch(brandstof) -> bool:
+    return bool(brandstof) and "ELEKTR" in brandstof.upper()
+
+
+def bereken_kosten(
+    voertuigen: pd.DataFrame,
+    jaarlijkse_km: float,
+    brandstofprijs: float,
+    elektraprijs: float,
+    rente: float,
+) -> pd.DataFrame:
+    """
+    Bereken de maandkosten voor alle auto's in ``voertuigen`` tegelijk.
+
+    Geeft een kopie van de tabel terug met de kolommen ``afschrijving_per_maand``,
+    ``brandstof_per_maand``, ``rente_per_maand``, ``kosten_excl_brandstof``,
+    ``kosten_incl_brandstof``, ``leaseprijs_incl`` en ``verschil``.
+    """
+    df = voertuigen.copy()
+    aanschafwaarde = df["aanschafwaarde"].to_numpy(dtype=float)
+    verbruik = df["verbruik"].to_numpy(dtype=float)
+    energieprijs = np.where(df["is_elektrisch"].to_numpy(dtype=bool), elektraprijs, brandstofprijs)
+
+    afschrijving_per_maand = (aanschafwaarde * (df["afschrijving_percentage"].to_numpy(dtype=float) / 100)) / 12
+    brandstof_per_maand = ((jaarlijkse_km / 100) * verbruik * energieprijs) / 12
+    rente_per_maand = (aanschafwaarde * (rente / 100)) / 12
+
+    kosten_excl_brandstof = (
+        afschrijving_per_maand
+        + rente_per_maand
+        + df["verzekering_per_maand"].to_numpy(dtype=float)
+        + df["onderhoud_per_maand"].to_numpy(dtype=float)
+        + df["wegenbelasting"].to_numpy(dtype=float)
+    )
+    kosten_incl_brandstof = kosten_excl_brandstof + brandstof_per_maand
+    leaseprijs_incl = df["leaseprijs"].to_numpy(dtype=float) + brandstof_per_maand
+
+    df["afschrijving_per_maand"] = afschrijving_per_maand
+    df["brandstof_per_maand"] = brandstof_per_maand
+    df["rente_per_maand"] = rente_per_maand
+    df["kosten_excl_brandstof"] = kosten_excl_brandstof
+    df["kosten_incl_brandstof"] = kosten_incl_brandstof
+    df["leaseprijs_incl"] = leaseprijs_incl
+    df["verschil"] = leaseprijs_incl - kosten_incl_brandstof
+    return df
+
+
+def parse_catalogusprijs(catalogusprijs) -> Optional[float]:
+    if catalogusprijs and catalogusprijs != "Geen data gevonden":
+        return float(catalogusprijs)
+    return None
+
+
+def effectieve_overrides(overrides: dict, kenteken: str, catalogusprijs) -> Tuple[float, float, float, float, float]:
+    """Geef (aanschafwaarde, afschrijving%, leaseprijs, verzekering, onderhoud) met standaardwaarden ingevuld."""
+    catalogus_numeriek = parse_catalogusprijs(catalogusprijs)
+    return (
+        overrides.get(f'aanschaf_{kenteken}', catalogus_numeriek if catalogus_numeriek is not None else DEFAULT_AANSCHAFWAARDE),
+        overrides.get(f'afschrijving_{kenteken}', DEFAULT_AFSCHRIJVING_PERCENTAGE),
+        overrides.get(f'lease_{kenteken}', DEFAULT_LEASEPRIJS),
+        overrides.get(f'verzekering_{kenteken}', DEFAULT_VERZEKERING_PER_MAAND),
+        overrides.get(f'onderhoud_{kenteken}', DEFAULT_ONDERHOUD_PER_MAAND),
+    )
+
+
+def verbruik_eenheid(brandstof) -> str:
+    # Zonder bekende brandstof toont de app kWh, net als voorheen
+    return "L/100km" if brandstof and "ELEKTR" not in brandstof.upper() else "kWh/100km"
+
+
+def naar_resultaten(berekend: pd.DataFrame) -> List[KostenResultaat]:
+    """Zet de uitvoer van `bereken_kosten` om naar een lijst `KostenResultaat`'s, in dezelfde volgorde."""
+    return [
+        KostenResultaat(
+            kenteken=row.kenteken,
+            merk=row.merk,
+            model=row.model,
+            catalogusprijs=parse_catalogusprijs(row.catalogusprijs),
+            aanschafwaarde=float(row.aanschafwaarde),
+            afschrijving_percentage=float(row.afschrijving_percentage),
+            afschrijving_per_maand=float(row.afschrijving_per_maand),
+            wegenbelasting=float(row.wegenbelasting),
+            onderhoud_per_maand=float(row.onderhoud_per_maand),
+            verbruik=float(row.verbruik),
+            verbruik_eenheid=verbruik_eenheid(row.brandstof),
+            brandstof_per_maand=float(row.brandstof_per_maand),
+            rente_per_maand=float(row.rente_per_maand),
+            verzekering_per_maand=float(row.verzekering_per_maand),
+            kosten_excl_brandstof=float(row.kosten_excl_brandstof),
+            kosten_incl_brandstof=float(row.kosten_incl_brandstof),
+            leaseprijs=float(row.leaseprijs),
+            leaseprijs_incl=float(row.leaseprijs_incl),
+            verschil=float(row.verschil),
+            bouwjaar=row.bouwjaar,
+            gewicht=row.gewicht,
+            kleur=row.kleur,
+            apk=row.apk,
+            co2=row.co2,
+            fijnstof=row.fijnstof,
+        )
+        for row in berekend.itertuples(index=False)
+    ]
@@ -0,0 +1,294 @@
+"""Ophalen van RDW- en wegenbelastingdata, los van Streamlit.
+
+De functies in deze module raken ``st.session_state`` niet aan, zodat ze veilig
+vanuit worker-threads aangeroepen kunnen worden. De caches (zie cache.py) geeft
+de aanroeper mee.
+"""
+import hashlib
+import re
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterable, List, Optional
+
+import pandas as pd
+import lxml.html
+import requests
+
+import http_client
+import metrics
+
+RDW_BASIS_URL = "https://opendata.rdw.nl/resource/m9d7-ebf2.json"
+RDW_BRANDSTOF_URL = "https://opendata.rdw.nl/resource/8ys7-d773.json"
+WEGENBELASTING_URL = "https://www.wegenbelasting.net/kenteken-check/"
+
+# Aantal kentekens per `$where=kenteken in (...)`-query; houdt de URL ruim
+# binnen de limieten van Socrata.
+RDW_CHUNK_SIZE = 100
+# Velden uit de basisdataset die in de loop van de tijd veranderen; de rest
+# (catalogusprijs, massa, brandstof, ...) ligt vast na de toelating.
+VLUCHTIGE_VELDEN = ("vervaldatum_apk",)
+
+# De resultaattabel als ruwe HTML, zodat alleen dat stuk geparsed hoeft te worden
+_RESULTAAT_TABEL = re.compile(
+    r"""<table\b[^>]*\bclass\s*=\s*["'][^"']*\bwb-resultaat\b[^"']*["'][^>]*>.*?</table\s*>""",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def normalize_kenteken(kenteken: str) -> str:
+    """Maak een kenteken geschikt voor RDW-queries (hoofdletters, geen streepjes)."""
+    return kenteken.upper().replace("-", "").strip()
+
+
+def _stap(url: str) -> str:
+    return "rdw_basis" if url == RDW_BASIS_URL else "rdw_brandstof"
+
+
+def _get_rdw_records_bulk(url: str, kentekens: List[str], validatie: Optional[Dict[str, Any]] = None) -> Optional[list]:
+    """
+    Records van ``kentekens`` uit één dataset. Met ``validatie`` (ETag en
+    Last-Modified per query) wordt het een voorwaardelijk verzoek; geeft None
+    als de RDW antwoordt dat er sinds de vorige keer niets veranderde (304).
+    """
+    quoted = ", ".join("'" + k.replace("'", "''") + "'" for k in kentekens)
+    params = {
+        "$where": f"kenteken in ({quoted})",
+        # Een kenteken kan meerdere brandstofregels hebben (bijv. hybrides)
+        "$limit": len(kentekens) * 10,
+    }
+    headers = {}
+    if validatie is not None:
+        sleutel = hashlib.sha1(f"{url}?{params['$where']}".encode()).hexdigest()
+        vorige = validatie.get(sleutel) or {}
+        if vorige.get("etag"):
+            headers["If-None-Match"] = vorige["etag"]
+        if vorige.get("last_modified"):
+            headers["If-Modified-Since"] = vorige["last_modified"]
+    with metrics.meet(_stap(url)):
+        response = http_client.get(url, params=params, headers=headers)
+        response.raise_for_status()
+        if response.status_code == 304:
+            return None
+        records = response.json()
+    if validatie is not None and ("ETag" in response.headers or "Last-Modified" in response.headers):
+        validatie[sleutel] = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+    return records
+
+
+def _merge_rdw_records(kentekens: List[str], data_basis: list, data_brandstof: list) -> Dict[str, Dict[str, Any]]:
+    """Voeg per kenteken het eerste basis- en brandstofrecord samen; een onbekend kenteken wordt "Geen data gevonden"."""
+    basis_per_kenteken = {}
+    for record in data_basis:
+        basis_per_kenteken.setdefault(record.get("kenteken"), record)
+    brandstof_per_kenteken = {}
+    for record in data_brandstof:
+        brandstof_per_kenteken.setdefault(record.get("kenteken"), record)
+    merged = {}
+    for kenteken in kentekens:
+        record = basis_per_kenteken.get(kenteken)
+        if record is None:
+            merged[kenteken] = {"error": "Geen data gevonden"}
+            continue
+        if kenteken in brandstof_per_kenteken:
+            record.update(brandstof_per_kenteken[kenteken])
+        merged[kenteken] = record
+    normalize_rdw_records([record for record in merged.values() if "error" not in record])
+    return merged
+
+
+DATUM_VELDEN = ("datum_eerste_toelating", "vervaldatum_apk")
+# Kleinere reeksen worden per waarde omgezet; de vaste kosten van pandas wegen daar zwaarder
+_VECTOR_DREMPEL = 32
+
+
+def _normaliseer_datum(veld: str, waarde: Any) -> Any:
+    """Eén datum zoals de app hem altijd omzette; alleen nog voor afwijkende notaties."""
+    try:
+        waarde = pd.to_datetime(waarde, dayfirst=True).strftime('%d-%m-%Y')
+    except ValueError:
+        pass
+    if veld == "datum_eerste_toelating":
+        try:
+            waarde = str(pd.to_datetime(waarde, dayfirst=True).year)
+        except ValueError:
+            pass
+    return waarde
+
+
+def _normaliseer_datum_snel(veld: str, waarde: Any) -> Any:
+    if isinstance(waarde, str) and len(waarde) == 8 and waarde.isdigit():
+        try:
+            datum = datetime.strptime(waarde, "%Y%m%d")
+        except ValueError:
+            pass
+        else:
+            return str(datum.year) if veld == "datum_eerste_toelating" else datum.strftime('%d-%m-%Y')
+    return _normaliseer_datum(veld, waarde)
+
+
+def normaliseer_datums(waarden: pd.Series, veld: str) -> pd.Series:
+    """
+    Zet een kolom met RDW-datums ("20190315") in één keer om: ``vervaldatum_apk``
+    naar "15-03-2019", ``datum_eerste_toelating`` naar het bouwjaar "2019".
+
+    Lege waarden blijven staan; andere notaties gaan per waarde door de
+    oorspronkelijke (trage) omzetting, zodat de uitkomst gelijk blijft.
+    """
+    waarden = waarden.astype(object)
+    datums = pd.to_datetime(waarden, format="%Y%m%d", errors="coerce")
+    geldig = datums.notna()
+    resultaat = waarden.copy()
+    if geldig.any():
+        if veld == "datum_eerste_toelating":
+            resultaat[geldig] = datums[geldig].dt.year.astype(str)
+        else:
+            resultaat[geldig] = datums[geldig].dt.strftime('%d-%m-%Y')
+    for index in waarden.index[~geldig & waarden.map(bool)]:
+        resultaat[index] = _normaliseer_datum(veld, waarden[index])
+    return resultaat
+
+
+def normalize_rdw_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Zet de datumvelden van een reeks RDW-records in één keer per veld om naar het formaat van de app."""
+    with metrics.meet("rdw_normalisatie"):
+        for veld in DATUM_VELDEN:
+            met_datum = [record for record in records if record.get(veld)]
+            if len(met_datum) < _VECTOR_DREMPEL:
+                for record in met_datum:
+                    record[veld] = _normaliseer_datum_snel(veld, record[veld])
+                continue
+            omgezet = normaliseer_datums(pd.Series([record[veld] for record in met_datum]), veld)
+            for record, waarde in zip(met_datum, omgezet):
+                record[veld] = waarde
+    return records
+
+
+def fetch_rdw_bulk(
+    kentekens: Iterable[str],
+    executor: Optional[ThreadPoolExecutor] = None,
+    chunk_size: int = RDW_CHUNK_SIZE,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Haal RDW-data voor veel kentekens op met één query per dataset per chunk.
+
+    Geeft een dict terug van genormaliseerd kenteken naar record, met
+    ``{"error": "Geen data gevonden"}`` voor onbekende kentekens en
+    ``{"error": "Error: ..."}`` voor de kentekens van een mislukte chunk. Met een ``executor`` lopen de chunks en beide datasets
+    parallel.
+    """
+    kentekens = list(dict.fromkeys(normalize_kenteken(k) for k in kentekens))
+    chunks = [kentekens[i:i + chunk_size] for i in range(0, len(kentekens), chunk_size)]
+
+    def fetch_chunk(chunk: List[str]) -> Dict[str, Dict[str, Any]]:
+        try:
+            if executor is not None:
+                future_brandstof = executor.submit(_get_rdw_records_bulk, RDW_BRANDSTOF_URL, chunk)
+                data_basis = _get_rdw_records_bulk(RDW_BASIS_URL, chunk)
+                data_brandstof = future_brandstof.result()
+            else:
+                data_basis = _get_rdw_records_bulk(RDW_BASIS_URL, chunk)
+                data_brandstof = _get_rdw_records_bulk(RDW_BRANDSTOF_URL, chunk)
+        except requests.RequestException as e:
+            return {kenteken: {"error": f"Error: {e}"} for kenteken in chunk}
+        return _merge_rdw_records(chunk, data_basis, data_brandstof)
+
+    results = {}
+    if executor is not None and len(chunks) > 1:
+        # De chunks zelf in een eigen pool, zodat de brandstof-queries in
+        # ``executor`` nooit achter hun eigen chunk-taak hoeven te wachten.
+        with ThreadPoolExecutor(max_workers=min(len(chunks), http_client.MAX_PER_HOST), thread_name_prefix="rdw-chunk") as chunk_executor:
+            for chunk_results in chunk_executor.map(fetch_chunk, chunks):
+                results.update(chunk_results)
+    else:
+        for chunk in chunks:
+            results.update(fetch_chunk(chunk))
+    return results
+
+
+def revalideer_rdw(
+    records: Dict[str, Dict[str, Any]],
+    validatie: Optional[Dict[str, Any]] = None,
+    chunk_size: int = RDW_CHUNK_SIZE,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Werk alleen de `VLUCHTIGE_VELDEN` van bestaande RDW-records bij.
+
+    Vraagt alleen de basisdataset op, per chunk van gesorteerde kentekens
+    zodat dezelfde vloot steeds dezelfde query geeft. Met ``validatie`` is
+    dat een voorwaardelijk verzoek; bij 304 blijven de records zoals ze zijn.
+    Geeft de gecontroleerde (en eventueel bijgewerkte) records terug; een
+    chunk die mislukt ontbreekt, zodat de aanroeper het later opnieuw kan
+    proberen.
+    """
+    kentekens = sorted(records)
+    gecontroleerd = {}
+    for start in range(0, len(kentekens), chunk_size):
+        chunk = kentekens[start:start + chunk_size]
+        try:
+            data_basis = _get_rdw_records_bulk(RDW_BASIS_URL, chunk, validatie)
+        except requests.RequestException:
+            continue
+        nieuw = {}
+        if data_basis is not None:
+            for basis in normalize_rdw_records(data_basis):
+                nieuw.setdefault(basis.get("kenteken"), basis)
+        for kenteken in chunk:
+            record = records[kenteken]
+            basis = nieuw.get(kenteken)
+            if basis is not None:
+                record = dict(record)
+                for veld in VLUCHTIGE_VELDEN:
+                    if veld in basis:
+                        record[veld] = basis[veld]
+                    else:
+                        record.pop(veld, None)
+            gecontroleerd[kenteken] = record
+    return gecontroleerd
+
+
+def parse_wegenbelasting_pagina(html: str) -> Dict[str, str]:
+    """
+    Haal de bedragen van alle provincies uit een resultaatpagina van wegenbelasting.net.
+
+    Alleen de ``wb-resultaat``-tabel wordt (met lxml) geparsed; de rest van de
+    pagina wordt overgeslagen. Geeft een lege dict als de tabel ontbreekt.
+    """
+    match = _RESULTAAT_TABEL.search(html)
+    if match is None:
+        return {}
+    table = lxml.html.fragment_fromstring(match.group(0))
+    provincies = {}
+    for row in table.iter("tr"):
+        tds = [cell for cell in row if cell.tag == "td"]
+        if len(tds) < 2:
+            continue
+        provincie = next(cell for cell in row if cell.tag in ("td", "th")).text_content().strip()
+        provincies.setdefault(provincie, tds[1].text_content().strip())
+    return provincies
+
+
+def prijs_voor_provincie(provincies: Dict[str, str], provincie: str = "Overijssel") -> str:
+    """Bedrag voor één provincie uit `fetch_wegenbelasting`; geeft de foutmelding door bij een fout."""
+    if "error" in provincies:
+        return provincies["error"]
+    if provincie in provincies:
+        return provincies[provincie]
+    for naam, prijs in provincies.items():
+        if provincie in naam:
+            return prijs
+    return "Niet gevonden"
+
+
+def fetch_wegenbelasting(kenteken: str) -> Dict[str, str]:
+    """Haal de wegenbelasting voor alle provincies op van wegenbelasting.net (webscraping)."""
+    post_data = {"submit_berekenen_kenteken": "1", "k": kenteken}
+    try:
+        with metrics.meet("wegenbelasting_scrape"):
+            response = http_client.post(WEGENBELASTING_URL, data=post_data)
+            response.raise_for_status()
+            return parse_wegenbelasting_pagina(response.text)
+    except requests.RequestException as e:
+        return {"error": f"Error: {e}"}
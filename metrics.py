@@ -0,0 +1,161 @@
+"""Tijdmetingen per stap en tellers, voor het debugpaneel en Prometheus.
+
+`meet` is een contextmanager die de duur van een stap (bijv. de RDW-basiscall
+of de kostenberekening) optelt; de tellers zijn proces-breed en thread-safe.
+`prometheus_tekst` geeft alles in het Prometheus-tekstformaat, inclusief de
+hit/miss-tellers van de caches en de throttle-tellers van http_client.
+
+Met ``AUTOPONTI_METRICS_FILE`` schrijft `exporteer` het naar dat bestand (voor
+de textfile-collector van node_exporter); met ``AUTOPONTI_METRICS_PORT``
+start `exporteer` één keer per proces een kleine HTTP-server met ``/metrics``.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List
+
+import cache
+import http_client
+
+METRICS_FILE = os.environ.get("AUTOPONTI_METRICS_FILE")
+METRICS_PORT = os.environ.get("AUTOPONTI_METRICS_PORT")
+
+# Stappen in de volgorde van de pijplijn, voor het debugpaneel
+STAPPEN = (
+    "rdw_basis",
+    "rdw_brandstof",
+    "rdw_normalisatie",
+    "wegenbelasting_scrape",
+    "kostenberekening",
+    "plotly_render",
+    "cache_opwarmen",
+    "cache_verversen",
+)
+CACHES = {
+    "rdw_cache": cache.rdw_cache,
+    "wegenbelasting_cache": cache.wegenbelasting_cache,
+    "provincie_cache": cache.provincie_cache,
+    "http_validatie_cache": cache.http_validatie_cache,
+}
+
+
+@dataclass
+class StapMeting:
+    aantal: int = 0
+    totaal: float = 0.0
+    maximum: float = 0.0
+
+
+_metingen: Dict[str, StapMeting] = {}
+_lock = threading.Lock()
+_server = None
+
+
+@contextmanager
+def meet(stap: str) -> Iterator[None]:
+    """Tel de duur van het blok op bij ``stap``, ook als het blok een exceptie geeft."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duur = time.perf_counter() - start
+        with _lock:
+            meting = _metingen.setdefault(stap, StapMeting())
+            meting.aantal += 1
+            meting.totaal += duur
+            meting.maximum = max(meting.maximum, duur)
+
+
+def stap_metingen() -> Dict[str, StapMeting]:
+    """Momentopname van alle stappen; bekende stappen eerst, in pijplijnvolgorde."""
+    with _lock:
+        kopie = {stap: StapMeting(m.aantal, m.totaal, m.maximum) for stap, m in _metingen.items()}
+    volgorde = [s for s in STAPPEN if s in kopie] + sorted(s for s in kopie if s not in STAPPEN)
+    return {stap: kopie[stap] for stap in volgorde}
+
+
+def reset() -> None:
+    with _lock:
+        _metingen.clear()
+
+
+def _label(waarde: str) -> str:
+    return str(waarde).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_tekst() -> str:
+    """Alle metingen en tellers in het Prometheus-tekstformaat (versie 0.0.4)."""
+    regels: List[str] = [
+        "# HELP autoponti_stage_seconds Duur van de stappen in de pijplijn.",
+        "# TYPE autoponti_stage_seconds summary",
+    ]
+    for stap, meting in stap_metingen().items():
+        regels.append(f'autoponti_stage_seconds_count{{stage="{_label(stap)}"}} {meting.aantal}')
+        regels.append(f'autoponti_stage_seconds_sum{{stage="{_label(stap)}"}} {meting.totaal:.6f}')
+
+    regels += [
+        "# HELP autoponti_cache_requests_total Opzoekingen in de caches, per uitkomst.",
+        "# TYPE autoponti_cache_requests_total counter",
+    ]
+    for naam, lookup_cache in CACHES.items():
+        regels.append(f'autoponti_cache_requests_total{{cache="{naam}",result="hit"}} {lookup_cache.hits}')
+        regels.append(f'autoponti_cache_requests_total{{cache="{naam}",result="miss"}} {lookup_cache.misses}')
+    regels += [
+        "# HELP autoponti_cache_items Items in het geheugen van de cache.",
+        "# TYPE autoponti_cache_items gauge",
+    ]
+    for naam, lookup_cache in CACHES.items():
+        regels.append(f'autoponti_cache_items{{cache="{naam}"}} {len(lookup_cache)}')
+
+    throttle = http_client.throttle_stats()
+    for teller, metriek, uitleg in (
+        ("vertraagd", "autoponti_http_throttled_total", "Verzoeken die op de rate limiter wachtten."),
+        ("wachttijd", "autoponti_http_throttle_wait_seconds_total", "Totale wachttijd op de rate limiter."),
+        ("429", "autoponti_http_429_total", "Antwoorden met status 429, inclusief herhaalde pogingen."),
+    ):
+        regels += [f"# HELP {metriek} {uitleg}", f"# TYPE {metriek} counter"]
+        for host, stats in throttle.items():
+            regels.append(f'{metriek}{{host="{_label(host)}"}} {stats[teller]:g}')
+    return "\n".join(regels) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_tekst().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_http_server(poort: int) -> None:
+    """Start (één keer per proces) een achtergrondserver met ``/metrics``."""
+    global _server
+    with _lock:
+        if _server is not None:
+            return
+        _server = ThreadingHTTPServer(("0.0.0.0", poort), _MetricsHandler)
+        _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+
+
+def exporteer() -> None:
+    """Schrijf het metriekbestand en/of start de HTTP-server, zoals geconfigureerd."""
+    if METRICS_PORT:
+        start_http_server(int(METRICS_PORT))
+    if METRICS_FILE:
+        tijdelijk = METRICS_FILE + ".tmp"
+        with open(tijdelijk, "w") as f:
+            f.write(prometheus_tekst())
+        # Atomair vervangen, zodat de collector nooit een half bestand leest
+        os.replace(tijdelijk, METRICS_FILE)
@@ -0,0 +1,237 @@
+"""Offline berekening van de motorrijtuigenbelasting (MRB) voor personenauto's.
+
+De belasting volgt uit het RDW-record dat we toch al ophalen: brandstof,
+massa, CO2- en fijnstofuitstoot en bouwjaar. De tarieftabel staat hieronder per
+kalenderjaar; de bedragen zijn per kwartaal, zoals in de Wet MRB en de
+Provinciewet. Voor een jaar dat niet in de tabel staat wordt niet berekend
+maar gescraped. Werk de tabel jaarlijks bij en controleer hem met
+``AUTOPONTI_MRB_BRON=controle``, waarmee de scraper van wegenbelasting.net als
+tegencontrole blijft meedraaien.
+
+Let op: de tabel bevat alleen 2025. Zolang de tarieven voor 2026 er niet in
+staan, wordt in 2026 elke auto gescraped, ook met ``offline``.
+
+Waarden voor ``AUTOPONTI_MRB_BRON``:
+
+- ``controle`` (standaard, tot de tabel gecontroleerd is): scrapen en het
+  gescrapete bedrag gebruiken; de berekening draait mee en afwijkingen
+  worden gelogd;
+- ``offline``: berekenen, alleen scrapen als berekenen niet lukt;
+- ``scraper``: altijd scrapen, zoals vroeger.
+"""
+import logging
+import math
+import os
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+
+from kosten import parse_wegenbelasting
+
+logger = logging.getLogger(__name__)
+
+# De bedragen voor 2025 zijn nog niet tegen wegenbelasting.net gecontroleerd
+MRB_BRON = os.environ.get("AUTOPONTI_MRB_BRON", "controle")
+# Maximaal verschil (per maand) tussen berekening en scraper voordat er gelogd wordt
+CONTROLE_MARGE = 1.00
+
+# Oldtimers vanaf deze leeftijd zijn vrijgesteld
+VRIJSTELLING_LEEFTIJD = 40
+# Een plug-in hybride herkennen we aan een CO2-uitstoot van hoogstens dit aantal g/km
+PHEV_MAX_CO2 = 50
+# Dieselauto's met meer fijnstof (g/km), of zonder opgave, krijgen de fijnstoftoeslag
+FIJNSTOF_GRENS = 0.005
+
+# Een gewichtstrap: (tot en met kg, vast bedrag, bedrag per begonnen 100 kg boven de ondergrens)
+Trap = Tuple[float, float, float]
+
+
+@dataclass(frozen=True)
+class Tariefjaar:
+    """Tarieven voor één kalenderjaar, in euro per kwartaal."""
+    # Hoofdsom voor benzine (art. 23 Wet MRB)
+    hoofdsom: Tuple[Trap, ...]
+    # Brandstoftoeslag bovenop de hoofdsom, per brandstof
+    brandstoftoeslag: Dict[str, Tuple[Trap, ...]]
+    # Grondslag voor de provinciale opcenten (art. 222 Provinciewet)
+    opcenten_grondslag: Tuple[Trap, ...]
+    # Opcenten per provincie
+    opcenten: Dict[str, float]
+    fijnstoftoeslag_percentage: float
+    # Deel van het volle tarief dat elektrische auto's en plug-in hybrides betalen
+    elektrisch_factor: float
+    phev_factor: float
+    # Gewicht dat bij elektrische auto's en plug-in hybrides van de massa af gaat
+    elektrisch_gewichtscorrectie: float = 0.0
+    phev_gewichtscorrectie: float = 0.0
+    # Brandstoffen die als benzine belast worden (geen toeslag)
+    zonder_toeslag: Tuple[str, ...] = field(default=("BENZINE",))
+
+
+_OPCENTEN_2025 = {
+    "Drenthe": 92.0,
+    "Flevoland": 85.4,
+    "Friesland": 87.9,
+    "Gelderland": 93.0,
+    "Groningen": 95.1,
+    "Limburg": 79.5,
+    "Noord-Brabant": 80.7,
+    "Noord-Holland": 67.9,
+    "Overijssel": 84.2,
+    "Utrecht": 78.7,
+    "Zeeland": 84.1,
+    "Zuid-Holland": 95.9,
+}
+
+TARIEVEN: Dict[int, Tariefjaar] = {
+    2025: Tariefjaar(
+        hoofdsom=(
+            (500, 18.75, 0.0),
+            (900, 18.75, 20.79),
+            (3300, 101.91, 27.94),
+            (math.inf, 772.47, 18.07),
+        ),
+        brandstoftoeslag={
+            "DIESEL": (
+                (900, 79.38, 0.0),
+                (math.inf, 79.38, 8.33),
+            ),
+            # LPG, aardgas en overige brandstoffen
+            "OVERIG": (
+                (900, 89.79, 0.0),
+                (math.inf, 89.79, 9.43),
+            ),
+        },
+        opcenten_grondslag=(
+            (500, 8.85, 0.0),
+            (900, 8.85, 9.88),
+            (3300, 48.37, 13.28),
+            (math.inf, 367.09, 9.03),
+        ),
+        opcenten=_OPCENTEN_2025,
+        fijnstoftoeslag_percentage=19.0,
+        elektrisch_factor=0.25,
+        phev_factor=0.75,
+        elektrisch_gewichtscorrectie=125.0,
+        phev_gewichtscorrectie=75.0,
+    ),
+}
+
+
+# Jaren zonder tarieven waarvoor al gelogd is, zodat de waarschuwing niet per auto komt
+_ontbrekende_jaren = set()
+
+
+def _trap_bedrag(trappen: Tuple[Trap, ...], gewicht: float) -> float:
+    ondergrens = 0.0
+    for bovengrens, vast, per_100kg in trappen:
+        if gewicht <= bovengrens:
+            if per_100kg:
+                # Elke begonnen 100 kg boven de ondergrens telt volledig mee
+                return vast + math.ceil((gewicht - ondergrens) / 100) * per_100kg
+            return vast
+        ondergrens = bovengrens
+    raise ValueError(f"Geen gewichtstrap voor {gewicht} kg")
+
+
+def _float(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _gewicht(car_data: Dict[str, Any]) -> Optional[float]:
+    """Massa ledig voertuig; de RDW-massa rijklaar is 100 kg zwaarder (bestuurder en brandstof)."""
+    gewicht = _float(car_data.get("massa_ledig_voertuig"))
+    if gewicht is None:
+        rijklaar = _float(car_data.get("massa_rijklaar"))
+        gewicht = rijklaar - 100 if rijklaar is not None else None
+    return gewicht
+
+
+def bereken_mrb(
+    car_data: Dict[str, Any],
+    provincie: str = "Overijssel",
+    jaar: Optional[int] = None,
+) -> Optional[float]:
+    """
+    Bereken de MRB per maand voor een personenauto uit zijn RDW-record.
+
+    Geeft None als de berekening niet kan (geen personenauto, jaar niet in
+    `TARIEVEN`, onbekende provincie, geen brandstof of massa); de aanroeper
+    kan dan terugvallen op de scraper.
+    """
+    # Bestelauto's, motoren en campers hebben eigen tarieven; die komen van de scraper
+    if car_data.get("voertuigsoort") != "Personenauto":
+        return None
+    jaar = jaar or date.today().year
+    tarief = TARIEVEN.get(jaar)
+    if tarief is None:
+        if jaar not in _ontbrekende_jaren:
+            _ontbrekende_jaren.add(jaar)
+            logger.warning("Geen MRB-tarieven voor %s; de wegenbelasting wordt gescraped", jaar)
+        return None
+    if provincie not in tarief.opcenten:
+        return None
+
+    brandstof = (car_data.get("brandstof_omschrijving") or "").upper()
+    gewicht = _gewicht(car_data)
+    if not brandstof or gewicht is None:
+        return None
+
+    bouwjaar = _float(car_data.get("datum_eerste_toelating"))
+    if bouwjaar is not None and jaar - bouwjaar >= VRIJSTELLING_LEEFTIJD:
+        return 0.0
+
+    elektrisch = "ELEKTR" in brandstof
+    co2 = _float(car_data.get("co2_uitstoot_gecombineerd"))
+    phev = not elektrisch and co2 is not None and co2 <= PHEV_MAX_CO2
+    if elektrisch:
+        gewicht -= tarief.elektrisch_gewichtscorrectie
+    elif phev:
+        gewicht -= tarief.phev_gewichtscorrectie
+    gewicht = max(gewicht, 0.0)
+
+    rijksdeel = _trap_bedrag(tarief.hoofdsom, gewicht)
+    if not elektrisch and brandstof not in tarief.zonder_toeslag:
+        toeslag_soort = "DIESEL" if brandstof == "DIESEL" else "OVERIG"
+        rijksdeel += _trap_bedrag(tarief.brandstoftoeslag[toeslag_soort], gewicht)
+        if brandstof == "DIESEL":
+            fijnstof = _float(car_data.get("uitstoot_deeltjes_licht"))
+            if fijnstof is None or fijnstof > FIJNSTOF_GRENS:
+                rijksdeel *= 1 + tarief.fijnstoftoeslag_percentage / 100
+    opcenten = _trap_bedrag(tarief.opcenten_grondslag, gewicht) * tarief.opcenten[provincie] / 100
+
+    per_kwartaal = rijksdeel + opcenten
+    if elektrisch:
+        per_kwartaal *= tarief.elektrisch_factor
+    elif phev:
+        per_kwartaal *= tarief.phev_factor
+    return round(per_kwartaal / 3, 2)
+
+
+def format_mrb(bedrag: float) -> str:
+    """Zelfde notatie als wegenbelasting.net ("€ 66,00"), zodat de rest van de app niets merkt."""
+    return f"€ {bedrag:.2f}".replace(".", ",")
+
+
+def bereken_mrb_tekst(car_data: Dict[str, Any], provincie: str = "Overijssel") -> Optional[str]:
+    bedrag = bereken_mrb(car_data, provincie)
+    return None if bedrag is None else format_mrb(bedrag)
+
+
+def moet_scrapen(car_data: Dict[str, Any]) -> bool:
+    """Of de scraper nodig is voor dit record, gegeven ``MRB_BRON``."""
+    if MRB_BRON in ("scraper", "controle"):
+        return True
+    return bereken_mrb(car_data) is None
+
+
+def controleer(kenteken: str, berekend: str, gescraped: str) -> None:
+    """Log een afwijking tussen berekening en scraper (alleen bij ``MRB_BRON=controle``)."""
+    if gescraped.startswith("Error") or gescraped == "Niet gevonden":
+        return
+    verschil = parse_wegenbelasting(berekend) - parse_wegenbelasting(gescraped)
+    if abs(verschil) > CONTROLE_MARGE:
+        logger.warning("MRB-afwijking voor %s: berekend %s, wegenbelasting.net %s", kenteken, berekend, gescraped)
@@ -0,0 +1,294 @@
+"""Van kenteken naar kostenresultaat, zonder Streamlit.
+
+Combineert het ophalen (lookups.py, via de gedeelde motor in engine.py) met
+de gedeelde caches (cache.py), de wegenbelasting (mrb.py) en de kostenformules
+(kosten.py). Zowel de app als de batchmodus (batch.py) gebruiken deze
+functies; de overrides en stamdata geeft de aanroeper mee.
+"""
+import threading
+from concurrent.futures import Future, as_completed
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+import cache
+import engine
+import kosten
+import metrics
+import mrb
+import rdw_mirror
+from lookups import normalize_kenteken, prijs_voor_provincie, revalideer_rdw
+
+# (jaarlijkse_km, brandstofprijs, elektraprijs, rente)
+StamdataKey = Tuple[float, float, float, float]
+
+DEFAULT_STAMDATA = {
+    'jaarlijkse_km': 35000,
+    'brandstofprijs': 2.00,
+    'elektraprijs': 0.35,
+    'rente': 5.0,
+}
+
+
+def stamdata_key(stamdata: Dict[str, Any]) -> StamdataKey:
+    """Zet opgeslagen stamdata om naar de tuple die de berekening gebruikt, met standaardwaarden."""
+    return tuple(stamdata.get(k, v) for k, v in DEFAULT_STAMDATA.items())
+
+
+def get_all_rdw_data(kenteken: str) -> Dict[str, Any]:
+    """Haal ALLE RDW-gegevens voor een kenteken op in één keer (gecached)."""
+    kenteken = normalize_kenteken(kenteken)
+    data = cache.rdw_cache.get(kenteken)
+    if data is None:
+        mirror = rdw_mirror.get_mirror()
+        data = mirror.get(kenteken) if mirror is not None else None
+        if data is None:
+            # De motor zet het record zelf in de cache
+            data = engine.get_engine().rdw(kenteken).result()
+        else:
+            # Met het tijdstip van de import, zodat een oude index niet vers lijkt
+            cache.rdw_cache.update({kenteken: data}, stored_at=mirror.geimporteerd_op)
+    return data
+
+
+def get_wegenbelasting_prices(kenteken: str) -> Dict[str, str]:
+    """Haal de wegenbelasting voor alle provincies op (webscraping, gecached)."""
+    provincies = cache.provincie_cache.get(kenteken)
+    if provincies is None:
+        provincies = engine.get_engine().wegenbelasting(kenteken).result()
+    return provincies
+
+
+def get_overijssel_price(kenteken: str) -> str:
+    """
+    Wegenbelasting voor Overijssel: offline berekend uit de RDW-data, of van wegenbelasting.net (gecached).
+
+    Bij ``MRB_BRON=controle`` telt het gescrapete bedrag; de berekening dient
+    dan alleen om afwijkingen te loggen.
+    """
+    berekend = None
+    if mrb.MRB_BRON != "scraper":
+        berekend = mrb.bereken_mrb_tekst(get_all_rdw_data(kenteken), "Overijssel")
+        if berekend is not None and mrb.MRB_BRON == "offline":
+            return berekend
+    price = cache.wegenbelasting_cache.get(kenteken)
+    if price is None:
+        price = prijs_voor_provincie(get_wegenbelasting_prices(kenteken), "Overijssel")
+        cache.wegenbelasting_cache[kenteken] = price
+    if berekend is not None:
+        mrb.controleer(kenteken, berekend, price)
+    return price
+
+
+def revalideren(kentekens: Iterable[str]) -> int:
+    """
+    Controleer de verouderde cache-items van ``kentekens`` opnieuw (zie `cache.LookupCache.stale`).
+
+    Per bron wordt alleen opgehaald wat kan veranderen: van een RDW-record de
+    vluchtige velden uit de basisdataset, met een voorwaardelijk verzoek (zie
+    `lookups.revalideer_rdw`); van de wegenbelasting een nieuwe scrape, zonder
+    de RDW-data. wegenbelasting.net kent geen ETag of Last-Modified, dus dat
+    blijft een volledige pagina. Mislukt een controle, dan blijft het oude item
+    staan. Geeft het aantal gecontroleerde items.
+    """
+    kentekens = list(kentekens)
+    verouderd = cache.rdw_cache.stale(dict.fromkeys(normalize_kenteken(k) for k in kentekens))
+    gecontroleerd = {}
+    if verouderd:
+        records = {kenteken: cache.rdw_cache.get(kenteken) for kenteken in verouderd}
+        gecontroleerd = revalideer_rdw(records, cache.http_validatie_cache)
+        cache.rdw_cache.update(gecontroleerd, refresh=True)
+
+    te_scrapen = [
+        kenteken for kenteken in cache.wegenbelasting_cache.stale(kentekens)
+        if mrb.moet_scrapen(cache.rdw_cache.get(normalize_kenteken(kenteken)) or {})
+    ]
+    opnieuw_gescraped = 0
+    motor = engine.get_engine()
+    for kenteken, future in [(k, motor.wegenbelasting(k)) for k in te_scrapen]:
+        provincies = future.result()
+        if "error" not in provincies:
+            cache.wegenbelasting_cache.update({kenteken: prijs_voor_provincie(provincies, "Overijssel")}, refresh=True)
+            opnieuw_gescraped += 1
+    return len(gecontroleerd) + opnieuw_gescraped
+
+
+# Kentekens waarvan de revalidatie al ingepland is, zodat een volgende aanvraag ze niet nog eens inplant
+_revalidatie_onderweg = set()
+_revalidatie_lock = threading.Lock()
+
+
+def revalideren_op_achtergrond(kentekens: Iterable[str]) -> Optional[Future]:
+    """
+    Plan `revalideren` in de achtergrondthread van de motor, zodat de aanroeper
+    direct verder kan met de gecachte waarden. Kentekens die al ingepland zijn
+    worden overgeslagen; geeft None als er niets nieuws in te plannen was.
+    """
+    with _revalidatie_lock:
+        nieuw = [k for k in dict.fromkeys(kentekens) if k not in _revalidatie_onderweg]
+        _revalidatie_onderweg.update(nieuw)
+    if not nieuw:
+        return None
+
+    def uitvoeren() -> int:
+        try:
+            return revalideren(nieuw)
+        finally:
+            with _revalidatie_lock:
+                _revalidatie_onderweg.difference_update(nieuw)
+
+    return engine.get_engine().achtergrond(uitvoeren)
+
+
+def ophalen(
+    kentekens: Iterable[str],
+    on_done: Optional[Callable[[str, Dict[str, Any], Optional[str]], None]] = None,
+) -> None:
+    """
+    Vul de gedeelde caches voor ``kentekens`` gelijktijdig, via de gedeelde motor (engine.py).
+
+    RDW-records die in de lokale index staan (zie rdw_mirror.py) gaan eerst
+    de cache in, met het tijdstip van de import; alleen de rest wordt bij de API opgevraagd. Verouderde items
+    worden gewoon gebruikt en op de achtergrond gecontroleerd
+    (`revalideren_op_achtergrond`). Daarna wordt per kenteken de
+    wegenbelasting opgehaald, tenzij de RDW-data een fout bevat of
+    `mrb.moet_scrapen` het niet nodig vindt. ``on_done`` volgt in de
+    aanroepende thread voor elk afgerond kenteken, ook als het al in de cache
+    stond.
+    """
+    kentekens = list(kentekens)
+    revalideren_op_achtergrond(kentekens)
+    # Eén opzoeking per kenteken, zodat de hit/miss-tellers kloppen
+    rdw_data = {rdw_key: cache.rdw_cache.get(rdw_key) for rdw_key in dict.fromkeys(normalize_kenteken(k) for k in kentekens)}
+    missers = [rdw_key for rdw_key, car_data in rdw_data.items() if car_data is None]
+    mirror = rdw_mirror.get_mirror()
+    if mirror is not None and missers:
+        uit_index = mirror.get_many(missers)
+        cache.rdw_cache.update(uit_index, stored_at=mirror.geimporteerd_op)
+        rdw_data.update(uit_index)
+    motor = engine.get_engine()
+    for rdw_key, car_data in rdw_data.items():
+        if car_data is None:
+            rdw_data[rdw_key] = motor.rdw(rdw_key)
+    for rdw_key, car_data in rdw_data.items():
+        if isinstance(car_data, Future):
+            rdw_data[rdw_key] = car_data.result()
+
+    futures = {}
+    for kenteken in dict.fromkeys(kentekens):
+        car_data = rdw_data[normalize_kenteken(kenteken)]
+        wb_str = cache.wegenbelasting_cache.get(kenteken)
+        if "error" in car_data or wb_str is not None or not mrb.moet_scrapen(car_data):
+            if on_done is not None:
+                on_done(kenteken, car_data, wb_str)
+            continue
+        futures[motor.wegenbelasting(kenteken)] = kenteken
+
+    for future in as_completed(futures):
+        kenteken = futures[future]
+        wb_str = prijs_voor_provincie(future.result(), "Overijssel")
+        cache.wegenbelasting_cache[kenteken] = wb_str
+        if on_done is not None:
+            on_done(kenteken, rdw_data[normalize_kenteken(kenteken)], wb_str)
+
+
+# Waarde die de RDW-API in oudere exports voor een ontbrekend veld gaf
+_ONTBREEKT = "Veld niet gevonden"
+# Elektrisch verbruik (Wh/km) als de RDW geen WLTP-waarde heeft
+DEFAULT_ELEKTRISCH_VERBRUIK = 170
+
+# (kenteken, RDW-record, wegenbelasting, uitkomst van `kosten.effectieve_overrides`)
+Voertuig = Tuple[str, Dict[str, Any], str, Tuple[float, ...]]
+
+
+def _ontbreekt(waarden: pd.Series) -> pd.Series:
+    return waarden.isna() | (waarden == _ONTBREEKT)
+
+
+def _veld(records: List[Dict[str, Any]], veld: str) -> pd.Series:
+    return pd.Series([record.get(veld) for record in records], dtype=object)
+
+
+def verbruik_kolom(records: List[Dict[str, Any]], is_elektrisch: pd.Series) -> pd.Series:
+    """
+    Verbruik per 100 km voor een reeks RDW-records: WLTP met NEDC als
+    terugval voor brandstof, WLTP (Wh/km, standaard 170) gedeeld door 10 voor
+    elektrisch. Niet-numerieke waarden worden 0.
+    """
+    elektrisch = _veld(records, "elektrisch_verbruik_enkel_elektrisch_wltp")
+    elektrisch = elektrisch.mask(_ontbreekt(elektrisch), DEFAULT_ELEKTRISCH_VERBRUIK)
+    brandstof = _veld(records, "brandstof_verbruik_gecombineerd_wltp")
+    brandstof = brandstof.mask(_ontbreekt(brandstof), _veld(records, "brandstofverbruik_gecombineerd"))
+    elektrisch = pd.to_numeric(elektrisch, errors="coerce").fillna(0.0) / 10
+    brandstof = pd.to_numeric(brandstof, errors="coerce").fillna(0.0)
+    return elektrisch.where(is_elektrisch, brandstof).astype(float)
+
+
+def voertuigen_tabel(voertuigen: List[Voertuig]) -> pd.DataFrame:
+    """
+    Invoertabel voor `kosten.bereken_kosten`, in één doorgang over de records.
+
+    Eén rij per auto met de overrides, de wegenbelasting en de velden uit het
+    RDW-record, met de terugvalregels voor verbruik en CO2 per kolom toegepast.
+    """
+    kentekens = [kenteken for kenteken, _, _, _ in voertuigen]
+    records = [car_data for _, car_data, _, _ in voertuigen]
+    effectief = [e for _, _, _, e in voertuigen]
+    brandstof = _veld(records, "brandstof_omschrijving")
+    is_elektrisch = brandstof.map(kosten.is_elektrisch).astype(bool)
+    co2 = _veld(records, "co2_uitstoot_gecombineerd")
+    co2 = co2.mask(_ontbreekt(co2), _veld(records, "co2_uitstoot_nettomax"))
+
+    return pd.DataFrame({
+        'kenteken': kentekens,
+        'merk': [record.get("merk", "Onbekend") for record in records],
+        'model': [record.get("handelsbenaming", "Onbekend") for record in records],
+        'catalogusprijs': _veld(records, "catalogusprijs"),
+        # Overrides en standaardwaarden
+        'aanschafwaarde': [e[0] for e in effectief],
+        'afschrijving_percentage': [e[1] for e in effectief],
+        'verzekering_per_maand': [e[3] for e in effectief],
+        'leaseprijs': [e[2] for e in effectief],
+        'onderhoud_per_maand': [e[4] for e in effectief],
+        # Rijtuigenbelasting
+        'wegenbelasting': [kosten.parse_wegenbelasting(wb_str) for _, _, wb_str, _ in voertuigen],
+        'verbruik': verbruik_kolom(records, is_elektrisch),
+        'brandstof': brandstof,
+        'is_elektrisch': is_elektrisch,
+        'bouwjaar': _veld(records, "datum_eerste_toelating"),
+        'gewicht': _veld(records, "massa_rijklaar"),
+        'kleur': _veld(records, "eerste_kleur"),
+        'apk': _veld(records, "vervaldatum_apk"),
+        'co2': co2,
+        'fijnstof': _veld(records, "uitstoot_deeltjes_licht"),
+    })
+
+
+def bereken(voertuigen: List[Voertuig], stamdata: StamdataKey) -> List[kosten.KostenResultaat]:
+    """Bereken de resultaten voor een lijst voertuigen in één gevectoriseerde stap."""
+    if not voertuigen:
+        return []
+    jaarlijkse_km, brandstofprijs, elektraprijs, rente = stamdata
+    with metrics.meet("kostenberekening"):
+        berekend = kosten.bereken_kosten(voertuigen_tabel(voertuigen), jaarlijkse_km, brandstofprijs, elektraprijs, rente)
+        return kosten.naar_resultaten(berekend)
+
+
+def bereken_kentekens(
+    kentekens: List[str],
+    overrides: Dict[str, Any],
+    stamdata: StamdataKey,
+    on_done: Optional[Callable[[str, Dict[str, Any], Optional[str]], None]] = None,
+) -> Tuple[List[kosten.KostenResultaat], List[str]]:
+    """Haal op en bereken een lijst kentekens in één keer; geeft (results, foutmeldingen) terug."""
+    ophalen(kentekens, on_done=on_done)
+    voertuigen = []
+    fouten = []
+    for kenteken in kentekens:
+        car_data = get_all_rdw_data(kenteken)
+        if "error" in car_data:
+            fouten.append(f"Fout bij ophalen data voor {kenteken}: {car_data['error']}")
+            continue
+        effectief = kosten.effectieve_overrides(overrides, kenteken, car_data.get("catalogusprijs"))
+        voertuigen.append((kenteken, car_data, get_overijssel_price(kenteken), effectief))
+    return bereken(voertuigen, stamdata), fouten
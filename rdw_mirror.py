@@ -0,0 +1,220 @@
+"""Lokale, geïndexeerde kopie van de RDW-bulkexports.
+
+De RDW biedt de datasets ``m9d7-ebf2`` (gekentekende voertuigen) en
+``8ys7-d773`` (brandstof) als CSV-download aan. ``importeer`` leest die
+bestanden in chunks en bewaart per kenteken alleen de velden die de app
+gebruikt, als compacte JSON in een SQLite-bestand met het kenteken als primaire
+sleutel. Opzoeken is dan één B-tree-lookup op een gememory-mapt bestand; wat er
+niet in staat (bijv. auto's van na de export) haalt de app gewoon bij de API.
+
+Bouwen (vanuit de root van de repo):
+
+    python rdw_mirror.py --basis Open_Data_RDW__Gekentekende_voertuigen.csv \\
+        --brandstof Open_Data_RDW__Gekentekende_voertuigen_brandstof.csv
+
+De nieuwe index wordt naast de oude opgebouwd en pas aan het eind op zijn
+plaats gezet, zodat een draaiende app nooit een half bestand ziet.
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import pandas as pd
+
+from lookups import DATUM_VELDEN, normalize_kenteken, normaliseer_datums
+
+MIRROR_FILE = os.environ.get("AUTOPONTI_RDW_MIRROR", "rdw_mirror.db")
+IMPORT_CHUNK_SIZE = 100_000
+# Aantal kentekens per `IN (...)`-query; ruim onder de SQLite-limiet van 999 parameters
+LOOKUP_CHUNK_SIZE = 500
+MMAP_SIZE = 1 << 30
+
+# Velden die de app uit de datasets gebruikt (namen zoals de API ze geeft)
+BASIS_VELDEN = (
+    "kenteken",
+    "voertuigsoort",
+    "merk",
+    "handelsbenaming",
+    "catalogusprijs",
+    "datum_eerste_toelating",
+    "massa_rijklaar",
+    "massa_ledig_voertuig",
+    "eerste_kleur",
+    "vervaldatum_apk",
+)
+BRANDSTOF_VELDEN = (
+    "kenteken",
+    "brandstof_volgnummer",
+    "brandstof_omschrijving",
+    "brandstofverbruik_gecombineerd",
+    "brandstof_verbruik_gecombineerd_wltp",
+    "elektrisch_verbruik_enkel_elektrisch_wltp",
+    "co2_uitstoot_gecombineerd",
+    "co2_uitstoot_nettomax",
+    "uitstoot_deeltjes_licht",
+)
+
+
+def api_veldnaam(kolom: str) -> str:
+    """Zet een kolomkop uit de CSV-export ("Uitstoot deeltjes (licht)") om naar de API-veldnaam."""
+    return re.sub(r"[^a-z0-9]+", "_", kolom.strip().lower()).strip("_")
+
+
+def _importeer_csv(conn: sqlite3.Connection, tabel: str, pad: str, velden: Iterable[str], chunk_size: int) -> int:
+    velden = set(velden)
+    aantal = 0
+    reader = pd.read_csv(
+        pad,
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunk_size,
+        usecols=lambda kolom: api_veldnaam(kolom) in velden,
+    )
+    for chunk in reader:
+        chunk.columns = [api_veldnaam(k) for k in chunk.columns]
+        if "kenteken" not in chunk.columns:
+            raise ValueError(f"{pad}: geen kolom Kenteken")
+        # Datums alvast omzetten, zodat opzoeken zonder datumparsing kan
+        for veld in DATUM_VELDEN:
+            if veld in chunk.columns:
+                chunk[veld] = normaliseer_datums(chunk[veld], veld)
+        rijen = []
+        for record in chunk.to_dict("records"):
+            # Lege velden weglaten, net als de API doet
+            record = {k: v for k, v in record.items() if v != ""}
+            volgnummer = int(record.get("brandstof_volgnummer", 1) or 1)
+            rijen.append((record["kenteken"], volgnummer, json.dumps(record, separators=(",", ":"))))
+        # Bij meerdere brandstofregels wint de laagste volgnummer, zoals de API als eerste teruggeeft
+        conn.executemany(
+            f"INSERT INTO {tabel} (kenteken, volgnummer, record) VALUES (?, ?, ?)"
+            " ON CONFLICT (kenteken) DO UPDATE SET volgnummer = excluded.volgnummer, record = excluded.record"
+            " WHERE excluded.volgnummer < volgnummer",
+            rijen,
+        )
+        aantal += len(rijen)
+    return aantal
+
+
+def importeer(pad: str, basis_csv: str, brandstof_csv: Optional[str] = None, chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict[str, int]:
+    """Bouw de index in ``pad`` uit de bulkexports; geeft het aantal ingelezen rijen per dataset."""
+    tijdelijk = pad + ".bouwen"
+    if os.path.exists(tijdelijk):
+        os.remove(tijdelijk)
+    conn = sqlite3.connect(tijdelijk, isolation_level=None)
+    try:
+        # Een afgebroken import wordt gewoon opnieuw gedaan; journaling is niet nodig
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        for tabel in ("basis", "brandstof"):
+            conn.execute(
+                f"CREATE TABLE {tabel} (kenteken TEXT PRIMARY KEY, volgnummer INTEGER NOT NULL, record TEXT NOT NULL) WITHOUT ROWID"
+            )
+        conn.execute("CREATE TABLE meta (dataset TEXT PRIMARY KEY, bestand TEXT, rijen INTEGER, geimporteerd_op REAL)")
+        aantallen = {}
+        for tabel, bestand, velden in (("basis", basis_csv, BASIS_VELDEN), ("brandstof", brandstof_csv, BRANDSTOF_VELDEN)):
+            if bestand is None:
+                continue
+            conn.execute("BEGIN")
+            aantallen[tabel] = _importeer_csv(conn, tabel, bestand, velden, chunk_size)
+            conn.execute(
+                "INSERT INTO meta VALUES (?, ?, ?, ?)",
+                (tabel, os.path.basename(bestand), aantallen[tabel], time.time()),
+            )
+            conn.execute("COMMIT")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(tijdelijk, pad)
+    return aantallen
+
+
+class RdwMirror:
+    """Alleen-lezen toegang tot een index van `importeer`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.geopend_op = os.path.getmtime(path)
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+            (geimporteerd_op,) = self._conn.execute("SELECT MIN(geimporteerd_op) FROM meta").fetchone()
+        # Tijdstip van de import: zo oud zijn de records, hoe recent het bestand ook geopend is
+        self.geimporteerd_op = self.geopend_op if geimporteerd_op is None else geimporteerd_op
+
+    def _records(self, tabel: str, kentekens: list) -> Dict[str, Dict[str, Any]]:
+        placeholders = ", ".join("?" * len(kentekens))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT kenteken, record FROM {tabel} WHERE kenteken IN ({placeholders})", kentekens
+            ).fetchall()
+        return {kenteken: json.loads(record) for kenteken, record in rows}
+
+    def get_many(self, kentekens: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Geef de samengevoegde records van alle gevonden kentekens.
+
+        De records zijn al bij de import genormaliseerd en gelijk aan die van
+        `lookups.fetch_rdw_bulk`, beperkt tot de velden van de app; ontbrekende
+        kentekens staan niet in het resultaat en moeten bij de API opgehaald worden.
+        """
+        kentekens = list(dict.fromkeys(normalize_kenteken(k) for k in kentekens))
+        gevonden = {}
+        for start in range(0, len(kentekens), LOOKUP_CHUNK_SIZE):
+            chunk = kentekens[start:start + LOOKUP_CHUNK_SIZE]
+            basis = self._records("basis", chunk)
+            if not basis:
+                continue
+            brandstof = self._records("brandstof", list(basis))
+            for kenteken, record in basis.items():
+                record.update(brandstof.get(kenteken, {}))
+                gevonden[kenteken] = record
+        return gevonden
+
+    def get(self, kenteken: str) -> Optional[Dict[str, Any]]:
+        return self.get_many([kenteken]).get(normalize_kenteken(kenteken))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_mirror: Optional[RdwMirror] = None
+_mirror_lock = threading.Lock()
+
+
+def get_mirror(path: str = MIRROR_FILE) -> Optional[RdwMirror]:
+    """De proces-brede index, of None als er (nog) geen is; een nieuw geïmporteerd bestand wordt opgepakt."""
+    global _mirror
+    if not os.path.exists(path):
+        return None
+    with _mirror_lock:
+        if _mirror is None or _mirror.path != path or _mirror.geopend_op != os.path.getmtime(path):
+            if _mirror is not None:
+                _mirror.close()
+            _mirror = RdwMirror(path)
+        return _mirror
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bouw de lokale RDW-index uit de bulkexports (CSV).")
+    parser.add_argument("--basis", required=True, help="CSV-export van Gekentekende voertuigen (m9d7-ebf2)")
+    parser.add_argument("--brandstof", help="CSV-export van Gekentekende voertuigen brandstof (8ys7-d773)")
+    parser.add_argument("--db", default=MIRROR_FILE)
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    aantallen = importeer(args.db, args.basis, args.brandstof, args.chunk_size)
+    for tabel, aantal in aantallen.items():
+        print(f"{tabel}: {aantal} rijen")
+    print(f"{args.db} gebouwd in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
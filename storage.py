@@ -0,0 +1,302 @@
+"""Persistente opslag in SQLite (WAL) in plaats van één groot JSON-bestand.
+
+Alle data staat als JSON-waarde per (namespace, key) in één tabel, zodat alleen
+gewijzigde sleutels geschreven hoeven te worden. Elke schrijfactie is één
+transactie; een crash halverwege laat de database intact.
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import cache
+
+# Namespaces uit het oude data.json-formaat
+NAMESPACES = ("overrides", "cars_info", "rdw_cache", "wegenbelasting_cache", "stamdata")
+# Namespaces met opgehaalde data, waarin oude tijdelijke fouten kunnen staan
+CACHE_NAMESPACES = ("rdw_cache", "wegenbelasting_cache")
+# Wijzigingen binnen dit venster worden samen in één transactie weggeschreven
+SAVE_DEBOUNCE_SECONDS = 2.0
+
+_stores: Dict[str, "Store"] = {}
+_stores_lock = threading.Lock()
+
+
+class Store:
+    """Key-value opslag per namespace op basis van SQLite."""
+
+    def __init__(self, path: str):
+        self.path = path
+        # Eén verbinding per proces; Streamlit start per rerun een nieuwe
+        # thread, dus per-thread verbindingen zouden zich opstapelen.
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        """Geef ``(waarde, updated_at)`` terug, of None als de sleutel niet bestaat."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, updated_at FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def get_all(self, namespace: str) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM entries WHERE namespace = ?", (namespace,)
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def updated_at(self, namespace: str) -> Dict[str, float]:
+        """Tijdstip van de laatste schrijfactie per sleutel, zonder de waarden te laden."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, updated_at FROM entries WHERE namespace = ?", (namespace,)
+            ).fetchall()
+        return dict(rows)
+
+    def set_many(
+        self,
+        namespace: str,
+        entries: Dict[str, Any],
+        removed: Iterable[str] = (),
+        updated_at: Optional[float] = None,
+    ) -> None:
+        """Schrijf gewijzigde en verwijderde sleutels van één namespace in één transactie."""
+        removed = list(removed)
+        if not entries and not removed:
+            return
+        updated_at = time.time() if updated_at is None else updated_at
+        rows = [(namespace, key, json.dumps(value), updated_at) for key, value in entries.items()]
+        with self._lock:
+            with self._transaction():
+                if rows:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO entries (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                        rows,
+                    )
+                if removed:
+                    self._conn.executemany(
+                        "DELETE FROM entries WHERE namespace = ? AND key = ?",
+                        [(namespace, key) for key in removed],
+                    )
+
+    def import_data(self, data: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Schrijf meerdere namespaces tegelijk in één transactie (gebruikt door de migratie).
+
+        Tijdelijke fouten in de caches (zie `cache.is_fout`) worden overgeslagen:
+        ze zouden met het tijdstip van de import weer een tijd geldig zijn.
+        """
+        updated_at = time.time()
+        rows = [
+            (namespace, key, json.dumps(value), updated_at)
+            for namespace in NAMESPACES
+            for key, value in (data.get(namespace) or {}).items()
+            if not (namespace in CACHE_NAMESPACES and cache.is_fout(value))
+        ]
+        with self._lock:
+            with self._transaction():
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entries (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+
+    @contextmanager
+    def _transaction(self):
+        # Aanroeper houdt de lock vast
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+
+class TrackedDict(dict):
+    """Dict die bijhoudt welke sleutels sinds de laatste opslag gewijzigd of verwijderd zijn.
+
+    Een toewijzing met dezelfde waarde telt niet als wijziging, zodat widgets die
+    bij elke rerun hun waarde terugschrijven geen schrijfactie veroorzaken.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._changed = set()
+        self._removed = set()
+        self._lock = threading.RLock()
+        # Loopt op bij elke echte wijziging; bruikbaar als goedkope cache-sleutel
+        self.revision = 0
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            if key in self and dict.__getitem__(self, key) == value:
+                return
+            super().__setitem__(key, value)
+            self._changed.add(key)
+            self._removed.discard(key)
+            self.revision += 1
+
+    def __delitem__(self, key):
+        with self._lock:
+            super().__delitem__(key)
+            self._changed.discard(key)
+            self._removed.add(key)
+            self.revision += 1
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        with self._lock:
+            if key not in self:
+                self[key] = default
+            return dict.__getitem__(self, key)
+
+    def pop(self, key, *default):
+        with self._lock:
+            if key not in self:
+                if default:
+                    return default[0]
+                raise KeyError(key)
+            value = dict.__getitem__(self, key)
+            del self[key]
+            return value
+
+    def popitem(self):
+        with self._lock:
+            key, value = super().popitem()
+            self._changed.discard(key)
+            self._removed.add(key)
+            self.revision += 1
+            return key, value
+
+    def clear(self):
+        with self._lock:
+            self._removed.update(self.keys())
+            self._changed.clear()
+            super().clear()
+            self.revision += 1
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._changed or self._removed)
+
+    def take_changes(self) -> Tuple[Dict[str, Any], List[str]]:
+        """Geef de openstaande wijzigingen terug en markeer de dict als opgeslagen."""
+        with self._lock:
+            changed = {key: dict.__getitem__(self, key) for key in self._changed}
+            removed = list(self._removed)
+            self._changed.clear()
+            self._removed.clear()
+        return changed, removed
+
+    def restore_changes(self, changed: Dict[str, Any], removed: Iterable[str]) -> None:
+        """Markeer wijzigingen opnieuw als openstaand, bijvoorbeeld na een mislukte opslag."""
+        with self._lock:
+            self._changed.update(key for key in changed if key in self)
+            self._removed.update(key for key in removed if key not in self)
+
+
+class DebouncedSaver:
+    """
+    Schrijft de wijzigingen van een set `TrackedDict`'s gebundeld naar de store.
+
+    `schedule` doet niets als er niets gewijzigd is; anders start het een timer
+    zodat snelle opeenvolgende wijzigingen in één transactie worden opgeslagen.
+    `flush` schrijft direct.
+    """
+
+    def __init__(self, store: Store, tracked: Dict[str, TrackedDict], delay: float = SAVE_DEBOUNCE_SECONDS):
+        self.store = store
+        self.tracked = tracked
+        self.delay = delay
+        self._timer = None
+        self._lock = threading.Lock()
+        _savers.add(self)
+
+    @property
+    def dirty(self) -> bool:
+        return any(d.dirty for d in self.tracked.values())
+
+    def schedule(self) -> None:
+        if not self.dirty:
+            return
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        for namespace, tracked in self.tracked.items():
+            changed, removed = tracked.take_changes()
+            if not changed and not removed:
+                continue
+            try:
+                self.store.set_many(namespace, changed, removed)
+            except Exception:
+                tracked.restore_changes(changed, removed)
+                raise
+
+
+_savers: "weakref.WeakSet[DebouncedSaver]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_pending_saves() -> None:
+    for saver in list(_savers):
+        saver.flush()
+
+
+def migrate_json(store: Store, json_path: str) -> bool:
+    """
+    Eenmalige migratie van het oude ``data.json``-formaat naar de store.
+
+    Na een geslaagde import wordt het bestand hernoemd naar ``<naam>.migrated``,
+    zodat de migratie niet nog eens draait.
+    """
+    if not os.path.exists(json_path):
+        return False
+    with open(json_path, "r") as f:
+        data = json.load(f)
+    store.import_data(data)
+    os.replace(json_path, json_path + ".migrated")
+    return True
+
+
+def get_store(path: str, legacy_json_path: Optional[str] = None) -> Store:
+    """Geef de proces-brede store voor ``path``; migreert eerst een eventueel oud JSON-bestand."""
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = Store(path)
+            if legacy_json_path:
+                migrate_json(store, legacy_json_path)
+    return store
@@ -0,0 +1,44 @@
+import io
+
+import pytest
+
+import vloot_import
+
+
+def _lees(inhoud: str):
+    bestand = io.BytesIO(inhoud.encode("utf-8"))
+    kentekens, overrides = [], {}
+    for chunk in vloot_import.lees_chunks(bestand, "vloot.csv"):
+        chunk_kentekens, chunk_overrides = vloot_import.verwerk_chunk(chunk)
+        kentekens += chunk_kentekens
+        overrides.update(chunk_overrides)
+    return kentekens, overrides
+
+
+def test_csv_met_alleen_kentekens():
+    assert _lees("kenteken\nAB-123-CD\nEF-456-GH\n") == (["AB-123-CD", "EF-456-GH"], {})
+
+
+@pytest.mark.parametrize("sep", [",", ";", "\t"])
+def test_csv_scheidingstekens(sep):
+    inhoud = sep.join(["Kenteken", "Leaseprijs", "Afschrijving"]) + "\n" + sep.join(["ab-123-cd", "450", "15%"]) + "\n"
+    kentekens, overrides = _lees(inhoud)
+    assert kentekens == ["AB-123-CD"]
+    assert overrides == {"lease_AB-123-CD": 450.0, "afschrijving_AB-123-CD": 15.0}
+
+
+def test_csv_puntkomma_met_decimale_komma():
+    kentekens, overrides = _lees("kenteken;aanschafprijs\nAB-123-CD;€ 35.000,50\n")
+    assert kentekens == ["AB-123-CD"]
+    assert overrides == {"aanschaf_AB-123-CD": 35000.5}
+
+
+def test_csv_in_chunks():
+    inhoud = "kenteken\n" + "".join(f"K{i:05d}\n" for i in range(7))
+    chunks = list(vloot_import.lees_chunks(io.BytesIO(inhoud.encode()), "vloot.csv", chunk_size=3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+
+
+def test_onbekend_bestandstype():
+    with pytest.raises(vloot_import.VlootImportFout):
+        list(vloot_import.lees_chunks(io.BytesIO(b""), "vloot.txt"))
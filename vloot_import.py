@@ -0,0 +1,135 @@
+"""Inlezen van wagenparkbestanden (CSV of Excel) in chunks.
+
+Een bestand heeft een kolom met kentekens en optioneel kolommen met per-auto
+overrides (aanschafprijs, afschrijving, leaseprijs, verzekering, onderhoud).
+Het bestand wordt nooit in zijn geheel in het geheugen gezet: elke chunk levert
+de kentekens en de overrides in hetzelfde formaat als
+``st.session_state.overrides`` (``f"{prefix}_{kenteken}"``).
+"""
+import csv
+import math
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+CHUNK_SIZE = 500
+# Scheidingstekens die we in een CSV herkennen; ',' als er maar één kolom is
+CSV_SCHEIDINGSTEKENS = ",;\t"
+
+KENTEKEN_KOLOMMEN = ("kenteken", "kentekens", "plate", "license_plate")
+# Override-prefix -> kolomnamen (kleine letters) die we daarvoor accepteren
+OVERRIDE_KOLOMMEN = {
+    "aanschaf": ("aanschaf", "aanschafprijs", "aanschafwaarde", "aanschafprijs excl btw"),
+    "afschrijving": ("afschrijving", "afschrijving%", "afschrijvings%", "afschrijvingspercentage"),
+    "lease": ("lease", "leaseprijs", "leaseprijs p/m"),
+    "verzekering": ("verzekering", "verzekering p/m"),
+    "onderhoud": ("onderhoud", "onderhoud p/m"),
+}
+
+
+class VlootImportFout(ValueError):
+    """Het wagenparkbestand kan niet gelezen worden."""
+
+
+def _lees_excel(bestand: IO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise VlootImportFout("Voor Excel-bestanden is openpyxl nodig (pip install openpyxl)") from e
+    workbook = load_workbook(bestand, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = ["" if h is None else str(h) for h in header]
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=header)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=header)
+    finally:
+        workbook.close()
+
+
+def _csv_scheidingsteken(bestand: IO) -> str:
+    """Bepaal het scheidingsteken uit de kopregel en zet het bestand terug naar het begin."""
+    kopregel = bestand.readline()
+    bestand.seek(0)
+    if isinstance(kopregel, bytes):
+        kopregel = kopregel.decode("utf-8-sig", errors="replace")
+    try:
+        return csv.Sniffer().sniff(kopregel, delimiters=CSV_SCHEIDINGSTEKENS).delimiter
+    except csv.Error:
+        # Eén kolom (alleen "kenteken"): niets te kiezen
+        return ","
+
+
+def lees_chunks(bestand: IO, bestandsnaam: str, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Lees een CSV- of Excelbestand als opeenvolgende DataFrames van hoogstens ``chunk_size`` rijen."""
+    naam = bestandsnaam.lower()
+    if naam.endswith(".csv"):
+        # ',' of ';' (Nederlandse Excel-export); niet pandas laten raden, want de
+        # Sniffer kiest bij één kolom een letter uit de kop als scheidingsteken
+        sep = _csv_scheidingsteken(bestand)
+        yield from pd.read_csv(bestand, sep=sep, dtype=str, chunksize=chunk_size)
+    elif naam.endswith((".xlsx", ".xlsm")):
+        yield from _lees_excel(bestand, chunk_size)
+    else:
+        raise VlootImportFout(f"Onbekend bestandstype: {bestandsnaam}")
+
+
+def _parse_getal(waarde: Any) -> Optional[float]:
+    """Lees een bedrag of percentage zoals "€ 35.000,00", "35000" of "15%"; None als dat niet lukt."""
+    if waarde is None:
+        return None
+    if isinstance(waarde, (int, float)):
+        return None if isinstance(waarde, float) and math.isnan(waarde) else float(waarde)
+    tekst = str(waarde).replace("€", "").replace("%", "").replace(" ", "").strip()
+    if not tekst:
+        return None
+    if "," in tekst and "." in tekst:
+        # Het laatste scheidingsteken is het decimaalteken
+        if tekst.rfind(",") > tekst.rfind("."):
+            tekst = tekst.replace(".", "").replace(",", ".")
+        else:
+            tekst = tekst.replace(",", "")
+    else:
+        tekst = tekst.replace(",", ".")
+    try:
+        return float(tekst)
+    except ValueError:
+        return None
+
+
+def _zoek_kolom(kolommen: Dict[str, str], namen: Tuple[str, ...]) -> Optional[str]:
+    for naam in namen:
+        if naam in kolommen:
+            return kolommen[naam]
+    return None
+
+
+def verwerk_chunk(chunk: pd.DataFrame) -> Tuple[List[str], Dict[str, float]]:
+    """Geef de kentekens (hoofdletters, in bestandsvolgorde) en de overrides uit één chunk."""
+    kolommen = {str(k).strip().lower(): k for k in chunk.columns}
+    kenteken_kolom = _zoek_kolom(kolommen, KENTEKEN_KOLOMMEN)
+    if kenteken_kolom is None:
+        raise VlootImportFout("Geen kolom 'kenteken' gevonden in het bestand")
+
+    kentekens = chunk[kenteken_kolom].fillna("").astype(str).str.strip().str.upper()
+    geldig = kentekens != ""
+    kentekens = kentekens[geldig]
+
+    overrides = {}
+    for prefix, namen in OVERRIDE_KOLOMMEN.items():
+        kolom = _zoek_kolom(kolommen, namen)
+        if kolom is None:
+            continue
+        for kenteken, ruwe_waarde in zip(kentekens, chunk.loc[geldig, kolom]):
+            waarde = _parse_getal(ruwe_waarde)
+            if waarde is not None:
+                overrides[f"{prefix}_{kenteken}"] = waarde
+    return list(kentekens), overrides
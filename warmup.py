@@ -0,0 +1,157 @@
+"""Opwarmen en verversen van de caches op de achtergrond.
+
+Bij de start van het proces laadt `start` alle bekende kentekens (uit de
+overrides, ``cars_info`` en eerder opgehaalde RDW-records in de store) in de
+gedeelde caches, zodat de eerste weergave na een herstart niet op de API hoeft
+te wachten. Daarna worden RDW-records die ouder zijn dan `VERVERS_NA`
+seconden in de daluren (`DALUREN`) opnieuw gecontroleerd, zodat bijvoorbeeld
+de APK-vervaldatum niet veroudert; net als in `pipeline.revalideren` alleen de
+vluchtige velden, met een voorwaardelijk verzoek. Een mislukte verversing laat
+het oude record staan.
+
+Alles draait in één daemon-thread en in delen van `BATCH_SIZE` kentekens,
+zodat sessies tussendoor hun verzoeken kwijt kunnen bij de rate limiter.
+Uitzetten met ``AUTOPONTI_WARMUP=0``.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import cache
+import metrics
+import pipeline
+from lookups import normalize_kenteken, revalideer_rdw
+
+logger = logging.getLogger(__name__)
+
+WARMUP_AAN = os.environ.get("AUTOPONTI_WARMUP", "1") != "0"
+# Leeftijd in seconden waarna een RDW-record ververst wordt; standaard die van de cache
+VERVERS_NA = float(os.environ.get("AUTOPONTI_VERVERS_NA", cache.RDW_REVALIDATIE))
+# Uren (begin-eind, eind exclusief) waarin ververst mag worden; "22-6" loopt over middernacht
+DALUREN = os.environ.get("AUTOPONTI_DALUREN", "1-6")
+# Seconden tussen twee controles op verouderde records
+CONTROLE_INTERVAL = 15 * 60
+BATCH_SIZE = 500
+# Pauze tussen twee delen, zodat de achtergrond de API niet aan één stuk bezet houdt
+BATCH_PAUZE = 1.0
+# Prefixen van de override-sleutels, bijv. ``lease_AB123C``
+OVERRIDE_PREFIXEN = ("aanschaf", "afschrijving", "lease", "verzekering", "onderhoud")
+
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+_status: Dict[str, Any] = {"opgewarmd": 0, "ververst": 0, "laatste_verversing": None}
+
+
+def _parse_daluren(waarde: str) -> Tuple[int, int]:
+    begin, _, eind = waarde.partition("-")
+    return int(begin), int(eind)
+
+
+def is_daluur(nu: Optional[datetime] = None, daluren: str = DALUREN) -> bool:
+    uur = (nu or datetime.now()).hour
+    begin, eind = _parse_daluren(daluren)
+    if begin <= eind:
+        return begin <= uur < eind
+    return uur >= begin or uur < eind
+
+
+def bekende_kentekens(store) -> List[str]:
+    """
+    Alle kentekens uit de overrides, ``cars_info`` en de RDW-cache in de store.
+
+    Zoals ze ingevoerd zijn (bijv. ``AB-123-C``): de wegenbelasting staat in
+    de cache onder die schrijfwijze, net als de overrides; alleen de RDW-cache
+    gebruikt het genormaliseerde kenteken. Een kenteken uit de RDW-cache komt
+    er alleen bij als het niet al in een andere schrijfwijze voorkomt.
+    """
+    kentekens = []
+    for sleutel in store.updated_at("overrides"):
+        prefix, _, kenteken = sleutel.partition("_")
+        if prefix in OVERRIDE_PREFIXEN and kenteken:
+            kentekens.append(kenteken)
+    kentekens += store.updated_at("cars_info")
+    kentekens = list(dict.fromkeys(kentekens))
+    genormaliseerd = {normalize_kenteken(k) for k in kentekens}
+    kentekens += [k for k in store.updated_at(cache.rdw_cache.namespace) if k not in genormaliseerd]
+    return kentekens
+
+
+def verouderde_kentekens(store, ouder_dan: float = VERVERS_NA, nu: Optional[float] = None) -> List[str]:
+    """RDW-records in de store die langer dan ``ouder_dan`` seconden niet zijn bijgewerkt, oudste eerst."""
+    grens = (time.time() if nu is None else nu) - ouder_dan
+    tijden = store.updated_at(cache.rdw_cache.namespace)
+    return sorted((k for k, t in tijden.items() if t < grens), key=tijden.get)
+
+
+def _in_delen(kentekens: List[str]):
+    for start in range(0, len(kentekens), BATCH_SIZE):
+        if start:
+            time.sleep(BATCH_PAUZE)
+        yield kentekens[start:start + BATCH_SIZE]
+
+
+def opwarmen(store) -> int:
+    """Laad alle bekende kentekens in de caches; wat ontbreekt of verlopen is wordt opgehaald."""
+    kentekens = bekende_kentekens(store)
+    with metrics.meet("cache_opwarmen"):
+        for deel in _in_delen(kentekens):
+            pipeline.ophalen(deel)
+    with _lock:
+        _status["opgewarmd"] = len(kentekens)
+    return len(kentekens)
+
+
+def verversen(store, ouder_dan: float = VERVERS_NA) -> int:
+    """Controleer verouderde RDW-records opnieuw; geeft het aantal ververste records."""
+    ververst = 0
+    with metrics.meet("cache_verversen"):
+        for deel in _in_delen(verouderde_kentekens(store, ouder_dan)):
+            records = {}
+            for kenteken in deel:
+                record = cache.rdw_cache.get(kenteken)
+                # "Niet gevonden" verloopt vanzelf en wordt dan gewoon opnieuw opgehaald
+                if record is not None and "error" not in record:
+                    records[kenteken] = record
+            # Een mislukte chunk ontbreekt in het resultaat; die volgt de volgende ronde opnieuw
+            gecontroleerd = revalideer_rdw(records, cache.http_validatie_cache)
+            cache.rdw_cache.update(gecontroleerd, refresh=True)
+            ververst += len(gecontroleerd)
+    with _lock:
+        _status["ververst"] += ververst
+        _status["laatste_verversing"] = time.time()
+    return ververst
+
+
+def status() -> Dict[str, Any]:
+    """Aantal opgewarmde en ververste kentekens en het tijdstip van de laatste verversing."""
+    with _lock:
+        return dict(_status)
+
+
+def _run(store) -> None:
+    try:
+        opwarmen(store)
+    except Exception:
+        logger.exception("Opwarmen van de caches mislukt")
+    while True:
+        if is_daluur():
+            try:
+                verversen(store)
+            except Exception:
+                logger.exception("Verversen van de RDW-cache mislukt")
+        time.sleep(CONTROLE_INTERVAL)
+
+
+def start(store) -> None:
+    """Start (één keer per proces) de achtergrondthread, tenzij uitgezet met ``AUTOPONTI_WARMUP=0``."""
+    global _thread
+    if not WARMUP_AAN:
+        return
+    with _lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_run, args=(store,), name="warmup", daemon=True)
+    _thread.start()